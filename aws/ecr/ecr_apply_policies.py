@@ -1,55 +1,175 @@
-import boto3
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from fnmatch import fnmatch
+from typing import Dict, Optional
+import argparse
 import json
 
-def apply_lifecycle_policies():
+from ecr_common import DEFAULT_WORKERS, IMAGES_TO_KEEP, create_ecr_client
+from ecr_snapshot import DEFAULT_TTL_MINUTES, add_snapshot_arguments, open_registry
+
+# Lifecycle policy to keep only 3 most recent images, used when no config
+# file is given
+DEFAULT_LIFECYCLE_POLICY = {
+    "rules": [
+        {
+            "rulePriority": 1,
+            "description": f"Keep only {IMAGES_TO_KEEP} most recent images",
+            "selection": {
+                "tagStatus": "any",
+                "countType": "imageCountMoreThan",
+                "countNumber": IMAGES_TO_KEEP
+            },
+            "action": {
+                "type": "expire"
+            }
+        }
+    ]
+}
+
+def load_policy_config(path: Optional[str]) -> Dict:
+    """
+    Loads the desired policies from a JSON file:
+
+        {
+            "default": {"rules": [...]},
+            "overrides": [
+                {"pattern": "team-a/*", "policy": {"rules": [...]}}
+            ]
+        }
+
+    Override patterns are shell-style wildcards matched against the
+    repository name; the first match wins. Without a file, every repository
+    gets DEFAULT_LIFECYCLE_POLICY.
+    """
+    if not path:
+        return {'default': DEFAULT_LIFECYCLE_POLICY, 'overrides': []}
+    with open(path, encoding='utf-8') as config_file:
+        config = json.load(config_file)
+    config.setdefault('default', DEFAULT_LIFECYCLE_POLICY)
+    config.setdefault('overrides', [])
+    return config
+
+def desired_policy(config: Dict, repo_name: str) -> Dict:
+    for override in config['overrides']:
+        if fnmatch(repo_name, override['pattern']):
+            return override['policy']
+    return config['default']
+
+def normalize_policy(policy: Dict) -> str:
+    # Key order, whitespace and rule order do not change a policy
+    rules = sorted(policy.get('rules', []), key=lambda rule: rule.get('rulePriority', 0))
+    return json.dumps({**policy, 'rules': rules}, sort_keys=True, separators=(',', ':'))
+
+def get_current_policy(ecr_client, repo: Dict) -> Optional[Dict]:
     try:
+        response = ecr_client.get_lifecycle_policy(
+            registryId=repo['registryId'],
+            repositoryName=repo['repositoryName']
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'LifecyclePolicyNotFoundException':
+            return None
+        raise
+    return json.loads(response['lifecyclePolicyText'])
+
+def reconcile_repository(ecr_client, repo: Dict, policy: Dict, dry_run: bool = False) -> str:
+    """
+    Writes the policy only when it differs from the one in place. Returns
+    'unchanged', 'updated' (or 'would update' in a dry run).
+    """
+    current = get_current_policy(ecr_client, repo)
+    if current is not None and normalize_policy(current) == normalize_policy(policy):
+        return 'unchanged'
+    if dry_run:
+        return 'would update'
+    ecr_client.put_lifecycle_policy(
+        registryId=repo['registryId'],
+        repositoryName=repo['repositoryName'],
+        lifecyclePolicyText=json.dumps(policy)
+    )
+    return 'updated'
+
+def apply_lifecycle_policies(
+    config_path: Optional[str] = None,
+    workers: int = DEFAULT_WORKERS,
+    dry_run: bool = False,
+    snapshot_path: Optional[str] = None,
+    snapshot_ttl_minutes: int = DEFAULT_TTL_MINUTES,
+    full_refresh: bool = False
+):
+    """
+    Reconciles the lifecycle policy of every repository with the desired
+    one: current policies are fetched in parallel and compared as normalized
+    JSON, and put_lifecycle_policy is only called for the ones that differ.
+    """
+    try:
+        config = load_policy_config(config_path)
+
         # Create ECR client
         # Assumes you have AWS credentials configured locally via AWS CLI
-        ecr_client = boto3.client('ecr')
-        
+        ecr_client = create_ecr_client(workers)
+        registry = open_registry(ecr_client, snapshot_path, snapshot_ttl_minutes, full_refresh, workers)
+
         # Get list of all repositories
         print("Fetching ECR repositories...")
-        repositories = ecr_client.describe_repositories()['repositories']
-        
+        repositories = registry.repositories()
+        registry.close()
+
         if not repositories:
             print("No ECR repositories found.")
             return
-        
-        # Lifecycle policy to keep only 3 most recent images
-        lifecycle_policy = {
-            "rules": [
-                {
-                    "rulePriority": 1,
-                    "description": "Keep only 3 most recent images",
-                    "selection": {
-                        "tagStatus": "any",
-                        "countType": "imageCountMoreThan",
-                        "countNumber": 3
-                    },
-                    "action": {
-                        "type": "expire"
-                    }
-                }
-            ]
-        }
-        
-        # Apply lifecycle policy to each repository
-        for repo in repositories:
-            repo_name = repo['repositoryName']
-            try:
-                ecr_client.put_lifecycle_policy(
-                    registryId=repo['registryId'],
-                    repositoryName=repo_name,
-                    lifecyclePolicyText=json.dumps(lifecycle_policy)
-                )
-                print(f"✅ Successfully applied lifecycle policy to: {repo_name}")
-            except Exception as e:
-                print(f"❌ Error applying lifecycle policy to {repo_name}: {str(e)}")
+
+        # Reconcile the lifecycle policy of each repository in parallel
+        counts = {'unchanged': 0, 'updated': 0, 'would update': 0, 'failed': 0}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(
+                    reconcile_repository, ecr_client, repo,
+                    desired_policy(config, repo['repositoryName']), dry_run
+                ): repo['repositoryName']
+                for repo in repositories
+            }
+            for future in as_completed(futures):
+                repo_name = futures[future]
+                try:
+                    status = future.result()
+                except Exception as e:
+                    counts['failed'] += 1
+                    print(f"❌ Error applying lifecycle policy to {repo_name}: {str(e)}")
+                    continue
+                counts[status] += 1
+                if status == 'updated':
+                    print(f"✅ Successfully applied lifecycle policy to: {repo_name}")
+                elif status == 'would update':
+                    print(f"📝 Lifecycle policy differs on: {repo_name}")
+
+        # Print summary
+        print("\nSummary:")
+        print(f"Repositories: {len(repositories)}")
+        print(f"Unchanged: {counts['unchanged']}")
+        if dry_run:
+            print(f"Would update: {counts['would update']}")
+        else:
+            print(f"Updated: {counts['updated']}")
+        print(f"Failed: {counts['failed']}")
 
     except Exception as e:
         print(f"Error: {str(e)}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Apply lifecycle policies to every ECR repository')
+    parser.add_argument('--config',
+                        help='JSON file with the default policy and per-repository-pattern overrides '
+                             '(default: keep the 3 most recent images)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Number of repositories reconciled in parallel (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Only report the repositories whose policy differs')
+    add_snapshot_arguments(parser)
+    args = parser.parse_args()
+
     print("Starting ECR lifecycle policy application...")
-    apply_lifecycle_policies()
-    print("Finished!")
\ No newline at end of file
+    apply_lifecycle_policies(args.config, args.workers, args.dry_run,
+                             args.snapshot, args.snapshot_ttl_minutes, args.full_refresh)
+    print("Finished!")
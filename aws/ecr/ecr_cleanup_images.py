@@ -1,81 +1,271 @@
-import boto3
-from datetime import datetime
-from typing import List, Dict
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import argparse
+import itertools
+import random
+import threading
+import time
+
+from ecr_common import (
+    DEFAULT_WORKERS,
+    IMAGES_TO_KEEP,
+    LiveRegistry,
+    RetentionPolicy,
+    create_ecr_client,
+    image_label
+)
+from ecr_snapshot import DEFAULT_TTL_MINUTES, add_snapshot_arguments, open_registry
+
+DEFAULT_DELETE_WORKERS = 4
+
+# batch_delete_image accepts at most 100 image IDs per call
+DELETE_BATCH_SIZE = 100
+DELETE_MAX_ATTEMPTS = 5
+# Per-image failure codes worth retrying; ImageNotFound means already deleted
+RETRYABLE_FAILURE_CODES = {'UpstreamTooManyRequests', 'UpstreamUnavailable', 'KmsError'}
+RETRYABLE_ERROR_CODES = {'ThrottlingException', 'ServerException', 'LimitExceededException'}
+
+_print_lock = threading.Lock()
+
+def _log(line: str) -> None:
+    # Single write per line, so lines of parallel repositories do not mix
+    with _print_lock:
+        print(line, flush=True)
+
+def _backoff(attempt: int) -> None:
+    # Exponential backoff with full jitter, capped at 20 seconds
+    time.sleep(random.uniform(0, min(20, 0.5 * 2 ** attempt)))
+
+def _delete_batch(ecr_client, repo_name: str, image_ids: List[Dict]) -> Tuple[int, List[Dict]]:
+    """
+    Deletes one batch of at most DELETE_BATCH_SIZE images, retrying throttled
+    calls and retryable per-image failures. Returns the number of deleted
+    images and the failures that remain.
+    """
+    deleted = 0
+    failures: List[Dict] = []
+    for attempt in range(DELETE_MAX_ATTEMPTS):
+        try:
+            response = ecr_client.batch_delete_image(
+                repositoryName=repo_name,
+                imageIds=image_ids
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] not in RETRYABLE_ERROR_CODES or attempt == DELETE_MAX_ATTEMPTS - 1:
+                raise
+            _backoff(attempt)
+            continue
+
+        deleted += len(response.get('imageIds', []))
+        retryable = []
+        for failure in response.get('failures', []):
+            if failure.get('failureCode') == 'ImageNotFound':
+                continue
+            if failure.get('failureCode') in RETRYABLE_FAILURE_CODES:
+                retryable.append(failure)
+            else:
+                failures.append(failure)
+
+        if not retryable:
+            break
+        if attempt == DELETE_MAX_ATTEMPTS - 1:
+            failures.extend(retryable)
+            break
+        # Only the retryable failures are sent again
+        image_ids = [failure['imageId'] for failure in retryable]
+        _backoff(attempt)
+
+    return deleted, failures
+
+def delete_images(
+    ecr_client,
+    repo_name: str,
+    image_ids: Iterable[Dict],
+    delete_workers: int = DEFAULT_DELETE_WORKERS
+) -> Tuple[int, List[Dict]]:
+    """
+    Deletes images by digest in batches of DELETE_BATCH_SIZE, running up to
+    delete_workers batches at once. image_ids may be a lazy iterator: batches
+    are sent as soon as they are full, with at most delete_workers batches
+    waiting, so the whole list is never held in memory. Digests are
+    deduplicated, so an image listed more than once (e.g. under several
+    tags) is only sent once.
+    """
+    seen = set()
+
+    def unique_ids() -> Iterator[Dict]:
+        for image_id in image_ids:
+            if image_id['imageDigest'] not in seen:
+                seen.add(image_id['imageDigest'])
+                yield image_id
+
+    deleted = 0
+    failures: List[Dict] = []
+    ids = unique_ids()
+    with ThreadPoolExecutor(max_workers=delete_workers) as executor:
+        pending = set()
+        for batch in iter(lambda: list(itertools.islice(ids, DELETE_BATCH_SIZE)), []):
+            if len(pending) >= delete_workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch_deleted, batch_failures = future.result()
+                    deleted += batch_deleted
+                    failures.extend(batch_failures)
+            pending.add(executor.submit(_delete_batch, ecr_client, repo_name, batch))
+        for future in pending:
+            batch_deleted, batch_failures = future.result()
+            deleted += batch_deleted
+            failures.extend(batch_failures)
+    return deleted, failures
+
+def cleanup_repository(
+    ecr_client,
+    repo_name: str,
+    delete_workers: int = DEFAULT_DELETE_WORKERS,
+    policy: Optional[RetentionPolicy] = None,
+    registry=None
+) -> Dict:
+    """
+    Deletes the images of one repository that the retention policy does not
+    keep (by default, all but the most recent ones).
+
+    Images are streamed page by page through a top-K selector, and each
+    image is sent for deletion as soon as it falls out of the newest ones,
+    so memory stays O(keep_last) per repository. "Will delete" lines are
+    printed as they happen, prefixed with the repository; the summary lines
+    are returned so they are printed as one block.
+
+    Images are read from registry (the ECR API or a RegistrySnapshot), and
+    deleted images are removed from it so a snapshot stays in sync. A
+    snapshot is first re-listed for this repository: an image deleted out of
+    band since the snapshot was taken would otherwise leave a slot in the
+    newest ones that the next image does not get, and it would be deleted.
+    """
+    policy = policy or RetentionPolicy()
+    registry = registry or LiveRegistry(ecr_client)
+    expired_digests: List[str] = []
+    started_at = time.monotonic()
+    lines = [f"\nProcessing repository: {repo_name}"]
+    result = {'repository': repo_name, 'images': 0, 'deleted': 0, 'failed': 0, 'lines': lines}
+
+    def expired_ids() -> Iterator[Dict]:
+        for image in policy.iter_expired(registry.iter_images(repo_name), selector):
+            _log(f"  [{repo_name}] Will delete: {image_label(image)} "
+                 f"(pushed on {image['imagePushedAt'].strftime('%Y-%m-%d %H:%M:%S')})")
+            expired_digests.append(image['imageDigest'])
+            yield {'imageDigest': image['imageDigest']}
 
-def cleanup_ecr_images():
     try:
+        registry.refresh_repository(repo_name)
+        selector = policy.selector()
+        deleted, failures = delete_images(ecr_client, repo_name, expired_ids(), delete_workers)
+        result['images'] = selector.count
+        failed_digests = {failure['imageId'].get('imageDigest') for failure in failures}
+        registry.remove_images(repo_name, [d for d in expired_digests if d not in failed_digests])
+
+        if not deleted and not failures:
+            lines.append(f"Repository has {selector.count} images. No cleanup needed.")
+        else:
+            # Process response
+            result['deleted'] = deleted
+            lines.append(f"Repository has {selector.count} images.")
+            lines.append(f"✅ Successfully deleted {deleted} images")
+            if failures:
+                result['failed'] = len(failures)
+                lines.append("❌ Failed to delete some images:")
+                for failure in failures:
+                    lines.append(f"  - {failure['imageId']}: {failure['failureReason']}")
+
+    except Exception as e:
+        result['error'] = str(e)
+        lines.append(f"❌ Error processing repository {repo_name}: {str(e)}")
+
+    finally:
+        result['seconds'] = time.monotonic() - started_at
+        lines.append(f"⏱️  {repo_name} processed in {result['seconds']:.2f}s")
+
+    return result
+
+def cleanup_ecr_images(
+    workers: int = DEFAULT_WORKERS,
+    delete_workers: int = DEFAULT_DELETE_WORKERS,
+    policy: Optional[RetentionPolicy] = None,
+    snapshot_path: Optional[str] = None,
+    snapshot_ttl_minutes: int = DEFAULT_TTL_MINUTES,
+    full_refresh: bool = False
+):
+    try:
+        started_at = time.monotonic()
+
         # Create ECR client
-        ecr_client = boto3.client('ecr')
-        
+        ecr_client = create_ecr_client(workers * delete_workers)
+        registry = open_registry(ecr_client, snapshot_path, snapshot_ttl_minutes, full_refresh, workers)
+
         # Get list of all repositories
         print("Fetching ECR repositories...")
-        repositories = ecr_client.describe_repositories()['repositories']
-        
+        repositories = registry.repositories()
+
         if not repositories:
             print("No ECR repositories found.")
             return
-        
-        # Process each repository
-        for repo in repositories:
-            repo_name = repo['repositoryName']
-            try:
-                print(f"\nProcessing repository: {repo_name}")
-                
-                # Get all images for the repository
-                images = ecr_client.describe_images(repositoryName=repo_name)['imageDetails']
-                
-                if len(images) <= 3:
-                    print(f"Repository has {len(images)} images. No cleanup needed.")
-                    continue
-                
-                # Sort images by push date (newest first)
-                sorted_images = sorted(
-                    images,
-                    key=lambda x: x['imagePushedAt'],
-                    reverse=True
+
+        print(f"Processing {len(repositories)} repositories with {workers} workers")
+
+        # Process repositories in parallel
+        results: List[Dict] = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    cleanup_repository, ecr_client, repo['repositoryName'], delete_workers, policy, registry
                 )
-                
-                # Keep the 3 most recent images
-                images_to_delete = sorted_images[3:]
-                
-                if not images_to_delete:
-                    continue
-                
-                # Prepare image identifiers for deletion
-                image_ids = []
-                for image in images_to_delete:
-                    identifier = {'imageDigest': image['imageDigest']}
-                    if 'imageTag' in image:
-                        print(f"  Will delete: {image['imageTag']} "
-                              f"(pushed on {image['imagePushedAt'].strftime('%Y-%m-%d %H:%M:%S')})")
-                    else:
-                        print(f"  Will delete: {image['imageDigest'][:12]} "
-                              f"(pushed on {image['imagePushedAt'].strftime('%Y-%m-%d %H:%M:%S')})")
-                    image_ids.append(identifier)
-                
-                # Delete the images
-                if image_ids:
-                    response = ecr_client.batch_delete_image(
-                        repositoryName=repo_name,
-                        imageIds=image_ids
-                    )
-                    
-                    # Process response
-                    if 'imageIds' in response:
-                        print(f"✅ Successfully deleted {len(response['imageIds'])} images")
-                    if 'failures' in response and response['failures']:
-                        print("❌ Failed to delete some images:")
-                        for failure in response['failures']:
-                            print(f"  - {failure['imageId']}: {failure['failureReason']}")
-                
-            except Exception as e:
-                print(f"❌ Error processing repository {repo_name}: {str(e)}")
-                continue
+                for repo in repositories
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                _log('\n'.join(result['lines']))
+                results.append(result)
+
+        # Print summary
+        elapsed = time.monotonic() - started_at
+        total_images = sum(r['images'] for r in results)
+        print("\nSummary:")
+        print(f"Repositories: {len(results)} ({sum(1 for r in results if 'error' in r)} with errors)")
+        print(f"Images scanned: {total_images}")
+        print(f"Images deleted: {sum(r['deleted'] for r in results)}")
+        print(f"Images failed: {sum(r['failed'] for r in results)}")
+        print(f"Elapsed: {elapsed:.1f}s ({len(results) / elapsed:.1f} repositories/sec, "
+              f"{total_images / elapsed:.1f} images/sec)")
+
+        slowest = sorted(results, key=lambda r: r['seconds'], reverse=True)[:5]
+        print("Slowest repositories:")
+        for result in slowest:
+            print(f"  {result['repository']}: {result['seconds']:.2f}s ({result['images']} images)")
+
+        registry.close()
 
     except Exception as e:
         print(f"Error: {str(e)}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Delete old images of every ECR repository')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Number of repositories processed in parallel (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--delete-workers', type=int, default=DEFAULT_DELETE_WORKERS,
+                        help='Concurrent batch_delete_image calls per repository '
+                             f'(default: {DEFAULT_DELETE_WORKERS})')
+    parser.add_argument('--keep-last', type=int, default=IMAGES_TO_KEEP,
+                        help=f'Number of most recent images kept per repository (default: {IMAGES_TO_KEEP})')
+    parser.add_argument('--keep-newer-than-days', type=int,
+                        help='Also keep images pushed less than this many days ago')
+    parser.add_argument('--keep-tag-pattern',
+                        help='Also keep images with a tag fully matching this regular expression')
+    add_snapshot_arguments(parser)
+    args = parser.parse_args()
+
+    retention = RetentionPolicy(args.keep_last, args.keep_newer_than_days, args.keep_tag_pattern)
+
     print("Starting ECR image cleanup...")
-    cleanup_ecr_images()
-    print("\nFinished!") 
\ No newline at end of file
+    cleanup_ecr_images(args.workers, args.delete_workers, retention,
+                       args.snapshot, args.snapshot_ttl_minutes, args.full_refresh)
+    print("\nFinished!")
@@ -0,0 +1,144 @@
+import boto3
+from botocore.config import Config
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterator, List, Optional
+import heapq
+import itertools
+import re
+
+DEFAULT_WORKERS = 16
+IMAGES_TO_KEEP = 3
+
+def create_ecr_client(workers: int = DEFAULT_WORKERS):
+    """
+    Creates an ECR client shared by all workers, with a connection pool
+    sized to the number of workers and adaptive retries for throttling.
+    """
+    client_config = Config(
+        max_pool_connections=max(workers, 10),
+        retries={'max_attempts': 10, 'mode': 'adaptive'}
+    )
+    return boto3.client('ecr', config=client_config)
+
+def iter_repositories(ecr_client) -> Iterator[Dict]:
+    # describe_repositories returns at most 100 repositories per call
+    paginator = ecr_client.get_paginator('describe_repositories')
+    for page in paginator.paginate():
+        yield from page['repositories']
+
+def iter_images(ecr_client, repo_name: str) -> Iterator[Dict]:
+    # describe_images returns at most 100 images per call
+    paginator = ecr_client.get_paginator('describe_images')
+    for page in paginator.paginate(repositoryName=repo_name):
+        yield from page['imageDetails']
+
+class LiveRegistry:
+    """
+    Reads the registry straight from the ECR API. Has the same interface as
+    RegistrySnapshot (ecr_snapshot.py), so scripts can use either.
+    """
+
+    def __init__(self, ecr_client):
+        self.ecr_client = ecr_client
+
+    def repositories(self) -> List[Dict]:
+        return list(iter_repositories(self.ecr_client))
+
+    def iter_images(self, repo_name: str) -> Iterator[Dict]:
+        return iter_images(self.ecr_client, repo_name)
+
+    def refresh_repository(self, repo_name: str) -> None:
+        pass
+
+    def remove_images(self, repo_name: str, digests: List[str]) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+def image_label(image: Dict) -> str:
+    # Tags of the image, or the short digest for untagged images
+    if image.get('imageTags'):
+        return ', '.join(image['imageTags'])
+    return image['imageDigest'][:19]
+
+
+class TopK:
+    """
+    Keeps the k largest items of a stream in a min-heap, so memory is O(k)
+    no matter how many items are pushed.
+    """
+
+    def __init__(self, k: int, key: Callable[[Dict], object]):
+        self.k = k
+        self.key = key
+        self.count = 0
+        self._heap: List[tuple] = []
+        # Tie breaker so items themselves are never compared
+        self._sequence = itertools.count()
+
+    def push(self, item: Dict) -> Optional[Dict]:
+        """
+        Adds an item and returns the one that fell out of the top k, if any.
+        """
+        self.count += 1
+        entry = (self.key(item), next(self._sequence), item)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+            return None
+        if entry[:2] <= self._heap[0][:2]:
+            return item
+        return heapq.heapreplace(self._heap, entry)[2]
+
+    def items(self) -> List[Dict]:
+        # Largest first
+        return [entry[2] for entry in sorted(self._heap, reverse=True)]
+
+
+class RetentionPolicy:
+    """
+    Decides which images of a repository are kept. An image is kept when any
+    rule matches it:
+
+    - it is one of the keep_last most recently pushed images;
+    - it was pushed less than keep_newer_than_days days ago;
+    - one of its tags fully matches keep_tag_pattern (a regular expression).
+    """
+
+    def __init__(
+        self,
+        keep_last: int = IMAGES_TO_KEEP,
+        keep_newer_than_days: Optional[int] = None,
+        keep_tag_pattern: Optional[str] = None
+    ):
+        if keep_last < 1:
+            raise ValueError('keep_last must be at least 1')
+        self.keep_last = keep_last
+        self.keep_newer_than_days = keep_newer_than_days
+        self.keep_tag_pattern = re.compile(keep_tag_pattern) if keep_tag_pattern else None
+
+    def is_protected(self, image: Dict, now: datetime) -> bool:
+        # Rules that keep an image regardless of how many newer images exist
+        if self.keep_newer_than_days is not None:
+            if image['imagePushedAt'] > now - timedelta(days=self.keep_newer_than_days):
+                return True
+        if self.keep_tag_pattern:
+            return any(self.keep_tag_pattern.fullmatch(tag) for tag in image.get('imageTags', []))
+        return False
+
+    def iter_expired(self, images: Iterator[Dict], selector: Optional[TopK] = None) -> Iterator[Dict]:
+        """
+        Streams the images and yields the ones that must be deleted as soon
+        as they are known to be outside the keep_last newest. Memory is
+        O(keep_last). Pass a TopK to read the kept images and the image count
+        once the stream is consumed.
+        """
+        now = datetime.now(timezone.utc)
+        selector = selector or self.selector()
+        for image in images:
+            evicted = selector.push(image)
+            if evicted is not None and not self.is_protected(evicted, now):
+                yield evicted
+
+    def selector(self) -> TopK:
+        return TopK(self.keep_last, key=lambda image: image['imagePushedAt'])
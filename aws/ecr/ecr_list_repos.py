@@ -1,15 +1,33 @@
-import boto3
 from datetime import datetime, timezone
+from typing import Optional
 from tabulate import tabulate
+import argparse
 
-def list_repositories_by_last_push():
+from ecr_common import IMAGES_TO_KEEP, RetentionPolicy, create_ecr_client
+from ecr_snapshot import DEFAULT_TTL_MINUTES, add_snapshot_arguments, open_registry
+
+def list_repositories_by_last_push(
+    policy: Optional[RetentionPolicy] = None,
+    snapshot_path: Optional[str] = None,
+    snapshot_ttl_minutes: int = DEFAULT_TTL_MINUTES,
+    full_refresh: bool = False
+):
+    """
+    Lists repositories by last push date. Images are streamed page by page
+    through the same retention selector used by ecr_cleanup_images.py, so
+    only the newest images are held in memory, and the "Expired Images"
+    column shows how many images a cleanup with the same policy would delete.
+    With snapshot_path, the registry is read from the local snapshot.
+    """
+    policy = policy or RetentionPolicy()
     try:
         # Create ECR client
-        ecr_client = boto3.client('ecr')
+        ecr_client = create_ecr_client()
+        registry = open_registry(ecr_client, snapshot_path, snapshot_ttl_minutes, full_refresh)
         
         # Get list of all repositories
         print("Fetching ECR repositories...")
-        repositories = ecr_client.describe_repositories()['repositories']
+        repositories = registry.repositories()
         
         if not repositories:
             print("No ECR repositories found.")
@@ -21,26 +39,24 @@ def list_repositories_by_last_push():
         for repo in repositories:
             repo_name = repo['repositoryName']
             try:
-                # Get all images for the repository
-                images = ecr_client.describe_images(
-                    repositoryName=repo_name
-                )['imageDetails']
-                
+                # Stream the images, keeping only the newest ones
+                selector = policy.selector()
+                expired_count = sum(1 for _ in policy.iter_expired(registry.iter_images(repo_name), selector))
+                image_count = selector.count
+
                 # If repository has images
-                if images:
-                    # Sort images by pushDate
-                    sorted_images = sorted(images, key=lambda x: x['imagePushedAt'])
-                    last_push_date = sorted_images[-1]['imagePushedAt']
+                if image_count:
+                    last_push_date = selector.items()[0]['imagePushedAt']
                     days_since_push = (datetime.now(timezone.utc) - last_push_date).days
-                    image_count = len(images)
                 else:
                     last_push_date = None
                     days_since_push = float('inf')  # To sort empty repos at the end
-                    image_count = 0
+                    expired_count = 0
 
                 repo_details.append({
                     'Repository Name': repo_name,
                     'Image Count': image_count,
+                    'Expired Images': expired_count,
                     'Last Push Date': last_push_date.strftime('%Y-%m-%d %H:%M:%S') if last_push_date else 'Never',
                     'Days Since Last Push': days_since_push if days_since_push != float('inf') else 'N/A',
                     'Created Date': repo['createdAt'].strftime('%Y-%m-%d %H:%M:%S')
@@ -55,7 +71,7 @@ def list_repositories_by_last_push():
         ))
 
         # Print results in a table format
-        headers = ['Repository Name', 'Image Count', 'Last Push Date', 'Days Since Last Push', 'Created Date']
+        headers = ['Repository Name', 'Image Count', 'Expired Images', 'Last Push Date', 'Days Since Last Push', 'Created Date']
         table_data = [[repo[h] for h in headers] for repo in repo_details]
         
         print("\nECR Repositories (ordered by oldest push date first):")
@@ -66,10 +82,24 @@ def list_repositories_by_last_push():
         empty_repos = sum(1 for repo in repo_details if repo['Image Count'] == 0)
         print(f"Empty repositories: {empty_repos}")
 
+        registry.close()
+
     except Exception as e:
         print(f"Error: {str(e)}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='List ECR repositories ordered by last push date')
+    parser.add_argument('--keep-last', type=int, default=IMAGES_TO_KEEP,
+                        help=f'Number of most recent images kept per repository (default: {IMAGES_TO_KEEP})')
+    parser.add_argument('--keep-newer-than-days', type=int,
+                        help='Also keep images pushed less than this many days ago')
+    parser.add_argument('--keep-tag-pattern',
+                        help='Also keep images with a tag fully matching this regular expression')
+    add_snapshot_arguments(parser)
+    args = parser.parse_args()
+
+    retention = RetentionPolicy(args.keep_last, args.keep_newer_than_days, args.keep_tag_pattern)
+
     print("Starting ECR repository analysis...")
-    list_repositories_by_last_push()
+    list_repositories_by_last_push(retention, args.snapshot, args.snapshot_ttl_minutes, args.full_refresh)
     print("\nFinished!")
\ No newline at end of file
@@ -0,0 +1,334 @@
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+import json
+import sqlite3
+import threading
+import time
+
+from ecr_common import DEFAULT_WORKERS, LiveRegistry
+
+DEFAULT_TTL_MINUTES = 60
+# describe_images accepts at most 100 image IDs per call
+DESCRIBE_BATCH_SIZE = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS repositories (
+    name TEXT PRIMARY KEY,
+    registry_id TEXT NOT NULL,
+    arn TEXT NOT NULL,
+    uri TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    image_count INTEGER NOT NULL DEFAULT 0,
+    last_pushed_at REAL,
+    last_pulled_at REAL,
+    refreshed_at REAL
+);
+CREATE TABLE IF NOT EXISTS images (
+    repository TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    tags TEXT NOT NULL,
+    pushed_at REAL NOT NULL,
+    last_pulled_at REAL,
+    size INTEGER,
+    PRIMARY KEY (repository, digest)
+);
+"""
+
+def _timestamp(value: Optional[datetime]) -> Optional[float]:
+    return value.timestamp() if value else None
+
+def _datetime(value: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(value, timezone.utc) if value is not None else None
+
+
+class RegistrySnapshot:
+    """
+    Local SQLite copy of the registry metadata (repositories and images),
+    shared by the ecr_* scripts so a maintenance window crawls ECR once.
+
+    While the snapshot is younger than ttl_minutes it is read without any
+    API call. When it is older, refresh() updates it incrementally:
+
+    - describe_repositories is listed again; deleted repositories are dropped;
+    - for each repository, list_images (digests and tags, 1000 per page) is
+      compared with the stored images, and only new digests and digests
+      whose tags changed are sent to describe_images; removed digests are
+      deleted;
+    - repositories whose images did not change keep their rows, so their
+      imagePushedAt/lastRecordedPullTime watermarks are kept as they were.
+
+    ECR has no "changed since" filter, so pull times of unchanged images are
+    only refreshed by a full refresh (describe_images on every repository).
+    """
+
+    def __init__(
+        self,
+        ecr_client,
+        path: str,
+        ttl_minutes: int = DEFAULT_TTL_MINUTES,
+        workers: int = DEFAULT_WORKERS
+    ):
+        self.ecr_client = ecr_client
+        self.path = path
+        self.ttl_seconds = ttl_minutes * 60
+        self.workers = workers
+        self._lock = threading.Lock()
+        # Repositories already refreshed by this process
+        self._refreshed = set()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        # WAL lets iter_images() readers stream while other threads write
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.executescript(SCHEMA)
+
+    def refreshed_at(self) -> Optional[float]:
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM meta WHERE key = 'refreshed_at'").fetchone()
+        return float(row[0]) if row else None
+
+    def is_fresh(self) -> bool:
+        refreshed_at = self.refreshed_at()
+        return refreshed_at is not None and time.time() - refreshed_at < self.ttl_seconds
+
+    def refresh(self, full: bool = False) -> Dict:
+        """
+        Brings the snapshot up to date and returns how many repositories were
+        listed and how many images were described, added, retagged and
+        removed.
+        """
+        stats = {'repositories': 0, 'changed': 0, 'described': 0, 'added': 0, 'retagged': 0, 'removed': 0}
+        repositories = LiveRegistry(self.ecr_client).repositories()
+        names = [repo['repositoryName'] for repo in repositories]
+        stats['repositories'] = len(names)
+
+        with self._lock:
+            self._connection.executemany(
+                'INSERT INTO repositories (name, registry_id, arn, uri, created_at) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (name) DO UPDATE SET registry_id = excluded.registry_id, arn = excluded.arn, '
+                'uri = excluded.uri, created_at = excluded.created_at',
+                [(repo['repositoryName'], repo['registryId'], repo['repositoryArn'], repo['repositoryUri'],
+                  _timestamp(repo['createdAt'])) for repo in repositories]
+            )
+            stored = [row[0] for row in self._connection.execute('SELECT name FROM repositories')]
+            for name in set(stored) - set(names):
+                self._connection.execute('DELETE FROM repositories WHERE name = ?', (name,))
+                self._connection.execute('DELETE FROM images WHERE repository = ?', (name,))
+            self._connection.commit()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for repo_stats in executor.map(lambda name: self._refresh_repository(name, full), names):
+                for key, value in repo_stats.items():
+                    stats[key] += value
+
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('refreshed_at', ?)", (str(time.time()),)
+            )
+            self._connection.commit()
+        return stats
+
+    def _refresh_repository(self, repo_name: str, full: bool) -> Dict:
+        with self._lock:
+            stored_tags = {digest: set(json.loads(tags)) for digest, tags in self._connection.execute(
+                'SELECT digest, tags FROM images WHERE repository = ?', (repo_name,)
+            )}
+        stored = set(stored_tags)
+
+        retagged = []
+        if full:
+            details = list(LiveRegistry(self.ecr_client).iter_images(repo_name))
+            current = {image['imageDigest'] for image in details}
+        else:
+            # list_images returns one entry per tag (imageTag is absent for
+            # untagged images), so the tags of each digest are rebuilt here
+            current_tags = {}
+            paginator = self.ecr_client.get_paginator('list_images')
+            for page in paginator.paginate(repositoryName=repo_name, PaginationConfig={'PageSize': 1000}):
+                for image_id in page['imageIds']:
+                    tags = current_tags.setdefault(image_id['imageDigest'], set())
+                    if 'imageTag' in image_id:
+                        tags.add(image_id['imageTag'])
+            current = set(current_tags)
+            added = sorted(current - stored)
+            # Existing images whose tags changed are described again, so tag
+            # based retention never sees stale tags
+            retagged = sorted(digest for digest in current & stored if current_tags[digest] != stored_tags[digest])
+            details = self._describe_digests(repo_name, added + retagged)
+            # Images deleted between list_images and describe_images
+            current -= set(added + retagged) - {image['imageDigest'] for image in details}
+
+        removed = stored - current
+        changed = current != stored or bool(retagged)
+        with self._lock:
+            self._connection.executemany(
+                'DELETE FROM images WHERE repository = ? AND digest = ?',
+                [(repo_name, digest) for digest in removed]
+            )
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO images (repository, digest, tags, pushed_at, last_pulled_at, size) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [(repo_name, image['imageDigest'], json.dumps(image.get('imageTags', [])),
+                  _timestamp(image['imagePushedAt']), _timestamp(image.get('lastRecordedPullTime')),
+                  image.get('imageSizeInBytes')) for image in details]
+            )
+            self._update_watermarks(repo_name)
+            self._connection.commit()
+            self._refreshed.add(repo_name)
+
+        return {
+            'changed': int(changed),
+            'described': len(details),
+            'added': len(current - stored),
+            'retagged': len(retagged),
+            'removed': len(removed)
+        }
+
+    def _describe_digests(self, repo_name: str, digests: List[str]) -> List[Dict]:
+        """
+        Describes the given digests in batches of DESCRIBE_BATCH_SIZE. A
+        digest deleted since list_images (e.g. expired by a lifecycle policy)
+        fails its whole batch with ImageNotFoundException, so that batch is
+        described again one image at a time, skipping the missing images.
+        """
+        details = []
+        for i in range(0, len(digests), DESCRIBE_BATCH_SIZE):
+            batch = digests[i:i + DESCRIBE_BATCH_SIZE]
+            try:
+                details.extend(self._describe(repo_name, batch))
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ImageNotFoundException':
+                    raise
+                for digest in batch:
+                    try:
+                        details.extend(self._describe(repo_name, [digest]))
+                    except ClientError as e:
+                        if e.response['Error']['Code'] != 'ImageNotFoundException':
+                            raise
+        return details
+
+    def _describe(self, repo_name: str, digests: List[str]) -> List[Dict]:
+        response = self.ecr_client.describe_images(
+            repositoryName=repo_name,
+            imageIds=[{'imageDigest': digest} for digest in digests]
+        )
+        return response['imageDetails']
+
+    def refresh_repository(self, repo_name: str) -> None:
+        """
+        Re-lists one repository (incrementally) unless this process already
+        refreshed it. The cleanup calls it right before deleting, so a stale
+        snapshot never decides which images of a repository are kept.
+        """
+        with self._lock:
+            if repo_name in self._refreshed:
+                return
+        self._refresh_repository(repo_name, full=False)
+
+    def _update_watermarks(self, repo_name: str) -> None:
+        # Must be called with the lock held
+        self._connection.execute(
+            'UPDATE repositories SET (image_count, last_pushed_at, last_pulled_at, refreshed_at) = '
+            '(SELECT COUNT(*), MAX(pushed_at), MAX(last_pulled_at), ? FROM images WHERE repository = ?) '
+            'WHERE name = ?',
+            (time.time(), repo_name, repo_name)
+        )
+
+    def repositories(self) -> List[Dict]:
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT name, registry_id, arn, uri, created_at, image_count, last_pushed_at, last_pulled_at '
+                'FROM repositories ORDER BY name'
+            ).fetchall()
+        return [{
+            'repositoryName': name,
+            'registryId': registry_id,
+            'repositoryArn': arn,
+            'repositoryUri': uri,
+            'createdAt': _datetime(created_at),
+            'imageCount': image_count,
+            'lastPushedAt': _datetime(last_pushed_at),
+            'lastRecordedPullTime': _datetime(last_pulled_at)
+        } for name, registry_id, arn, uri, created_at, image_count, last_pushed_at, last_pulled_at in rows]
+
+    def iter_images(self, repo_name: str) -> Iterator[Dict]:
+        # Own connection, so rows are streamed from the cursor without holding
+        # the shared lock while the caller consumes them
+        connection = sqlite3.connect(self.path)
+        try:
+            rows = connection.execute(
+                'SELECT digest, tags, pushed_at, last_pulled_at, size FROM images WHERE repository = ?',
+                (repo_name,)
+            )
+            yield from self._image_rows(repo_name, rows)
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _image_rows(repo_name: str, rows) -> Iterator[Dict]:
+        for digest, tags, pushed_at, last_pulled_at, size in rows:
+            image = {
+                'repositoryName': repo_name,
+                'imageDigest': digest,
+                'imagePushedAt': _datetime(pushed_at),
+                'imageSizeInBytes': size
+            }
+            tags = json.loads(tags)
+            if tags:
+                image['imageTags'] = tags
+            if last_pulled_at is not None:
+                image['lastRecordedPullTime'] = _datetime(last_pulled_at)
+            yield image
+
+    def remove_images(self, repo_name: str, digests: List[str]) -> None:
+        # Keeps the snapshot in sync after a cleanup deleted these images
+        with self._lock:
+            self._connection.executemany(
+                'DELETE FROM images WHERE repository = ? AND digest = ?',
+                [(repo_name, digest) for digest in digests]
+            )
+            self._update_watermarks(repo_name)
+            self._connection.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+def open_registry(
+    ecr_client,
+    snapshot_path: Optional[str] = None,
+    ttl_minutes: int = DEFAULT_TTL_MINUTES,
+    full_refresh: bool = False,
+    workers: int = DEFAULT_WORKERS
+):
+    """
+    Returns the registry the scripts read from: the ECR API itself when no
+    snapshot path is given, otherwise the local snapshot, refreshed first if
+    it is older than ttl_minutes (or always, with full_refresh).
+    """
+    if not snapshot_path:
+        return LiveRegistry(ecr_client)
+
+    snapshot = RegistrySnapshot(ecr_client, snapshot_path, ttl_minutes, workers)
+    if full_refresh or not snapshot.is_fresh():
+        print(f"Refreshing registry snapshot {snapshot_path}...")
+        stats = snapshot.refresh(full=full_refresh)
+        print(f"Snapshot refreshed: {stats['repositories']} repositories, {stats['changed']} changed, "
+              f"{stats['added']} images added, {stats['retagged']} retagged, {stats['removed']} removed, {stats['described']} described")
+    else:
+        print(f"Using registry snapshot {snapshot_path} (younger than {ttl_minutes} minutes)")
+    return snapshot
+
+def add_snapshot_arguments(parser) -> None:
+    # Options shared by the ecr_* scripts
+    parser.add_argument('--snapshot',
+                        help='Read the registry from this local SQLite snapshot instead of crawling ECR')
+    parser.add_argument('--snapshot-ttl-minutes', type=int, default=DEFAULT_TTL_MINUTES,
+                        help=f'Refresh the snapshot when it is older than this (default: {DEFAULT_TTL_MINUTES})')
+    parser.add_argument('--full-refresh', action='store_true',
+                        help='Describe every image again, refreshing pull times (requires --snapshot)')
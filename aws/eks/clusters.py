@@ -0,0 +1,103 @@
+import atexit
+import base64
+import os
+import tempfile
+
+from kubernetes import client, config
+
+# Validade do token gerado para os clusters EKS (segundos)
+EKS_TOKEN_EXPIRES_IN = 60
+
+# Certificados de CA gravados pelo eks_api_client, removidos ao final da
+# execução (como o kubernetes faz com os certificados do kubeconfig)
+_ca_files = []
+
+
+@atexit.register
+def _remove_ca_files():
+    for path in _ca_files:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def context_clusters(contexts=None):
+    """
+    Clusters a partir dos contextos do kubeconfig: os informados ou, se
+    contexts estiver vazio, todos. Retorna pares (nome, fábrica de
+    ApiClient); o cliente só é criado na thread de cada cluster.
+    """
+    if not contexts:
+        available, _ = config.list_kube_config_contexts()
+        contexts = [context['name'] for context in available]
+    return [
+        (context, lambda context=context: config.new_client_from_config(context=context))
+        for context in contexts
+    ]
+
+
+def eks_clusters(regions, session_factory=None):
+    """
+    Descobre os clusters EKS das regiões com list_clusters. Cada cluster é
+    acessado com um token gerado como no "aws eks get-token", sem depender
+    de contextos no kubeconfig.
+
+    As sessões do boto3 não são thread-safe, então cada fábrica cria a sua
+    com session_factory (padrão: boto3.session.Session) na thread do cluster.
+    """
+    import boto3
+
+    session_factory = session_factory or boto3.session.Session
+    session = session_factory()
+    clusters = []
+    for region in regions:
+        eks = session.client('eks', region_name=region)
+        for page in eks.get_paginator('list_clusters').paginate():
+            for name in page['clusters']:
+                clusters.append((
+                    f'{region}/{name}',
+                    lambda name=name, region=region: eks_api_client(session_factory(), region, name)
+                ))
+    return clusters
+
+
+def eks_token(session, region, cluster_name):
+    # URL pré-assinada do sts:GetCallerIdentity, como o aws-iam-authenticator
+    from botocore.signers import RequestSigner
+
+    sts = session.client('sts', region_name=region)
+    signer = RequestSigner(
+        sts.meta.service_model.service_id, region, 'sts', 'v4',
+        session.get_credentials(), session.events
+    )
+    url = signer.generate_presigned_url(
+        {
+            'method': 'GET',
+            'url': f'https://sts.{region}.amazonaws.com/?Action=GetCallerIdentity&Version=2011-06-15',
+            'body': {},
+            'headers': {'x-k8s-aws-id': cluster_name},
+            'context': {}
+        },
+        region_name=region,
+        expires_in=EKS_TOKEN_EXPIRES_IN,
+        operation_name=''
+    )
+    return 'k8s-aws-v1.' + base64.urlsafe_b64encode(url.encode('utf-8')).decode('utf-8').rstrip('=')
+
+
+def eks_api_client(session, region, cluster_name):
+    cluster = session.client('eks', region_name=region).describe_cluster(name=cluster_name)['cluster']
+
+    # O certificado da CA precisa estar em um arquivo para o cliente
+    ca_file = tempfile.NamedTemporaryFile(delete=False, suffix='.crt')
+    ca_file.write(base64.b64decode(cluster['certificateAuthority']['data']))
+    ca_file.close()
+    _ca_files.append(ca_file.name)
+
+    configuration = client.Configuration()
+    configuration.host = cluster['endpoint']
+    configuration.ssl_ca_cert = ca_file.name
+    configuration.api_key = {'authorization': eks_token(session, region, cluster_name)}
+    configuration.api_key_prefix = {'authorization': 'Bearer'}
+    return client.ApiClient(configuration)
@@ -1,9 +1,317 @@
 #!/usr/bin/env python3
 from kubernetes import client, config
-from operator import itemgetter
+from kubernetes.client.rest import ApiException
+from kubernetes.watch.watch import iter_resp_lines
+from decimal import Decimal
+from functools import lru_cache
 from tabulate import tabulate
+import argparse
+import json
+import random
+import re
+import threading
+import time
+
+import numpy as np
+from urllib3.exceptions import HTTPError as ConnectionFailure
+
+from clusters import context_clusters, eks_clusters
+from live_index import LIVE_COLUMNS, LIVE_GROUPS, PodIndex, serve_prometheus
+from resource_table import VALUE_COLUMNS, ContainerTable, export_table, top_n
+
+# Pods por página na listagem; a memória usada fica limitada a uma página
+PAGE_SIZE = 500
+# Containers acumulados por build_table antes de converter as quantidades
+# de request/limit de uma vez (parse_quantities)
+BUILD_CHUNK_SIZE = 10000
+# Colunas de request/limit: (coluna, campo do container, recurso)
+QUANTITY_COLUMNS = [
+    ('cpu_request', 'requests', 'cpu'),
+    ('cpu_limit', 'limits', 'cpu'),
+    ('memory_request', 'requests', 'memory'),
+    ('memory_limit', 'limits', 'memory')
+]
+
+# Sufixos de quantidades do Kubernetes e seus multiplicadores
+BINARY_SUFFIXES = {'Ki': 2 ** 10, 'Mi': 2 ** 20, 'Gi': 2 ** 30, 'Ti': 2 ** 40, 'Pi': 2 ** 50, 'Ei': 2 ** 60}
+DECIMAL_SUFFIXES = {
+    'n': Decimal('1e-9'), 'u': Decimal('1e-6'), 'm': Decimal('1e-3'), '': Decimal(1),
+    'k': Decimal('1e3'), 'M': Decimal('1e6'), 'G': Decimal('1e9'), 'T': Decimal('1e12'),
+    'P': Decimal('1e15'), 'E': Decimal('1e18')
+}
+QUANTITY_PATTERN = re.compile(r'^([+-]?(?:\d+\.?\d*|\.\d+))(?:([eE][+-]?\d+)|(Ki|Mi|Gi|Ti|Pi|Ei|[numkMGTPE])?)$')
+MIB = 2 ** 20
+# Modo contínuo (--watch): duração de cada conexão do watch e intervalo
+# entre as tabelas
+WATCH_TIMEOUT_SECONDS = 300
+REFRESH_SECONDS = 30
+# Espera máxima entre reconexões do watch após falhas seguidas
+WATCH_BACKOFF_MAX_SECONDS = 60
+# Tempo máximo de espera por cluster no modo com vários clusters
+CLUSTER_TIMEOUT_SECONDS = 120
+# Grupos mostrados no relatório
+TOP_N = 50
+GROUP_LABELS = {'cluster': 'Cluster', 'pod': 'Pod', 'container': 'Container', 'namespace': 'Namespace', 'node': 'Nó', 'owner': 'Workload'}
+SORT_COLUMNS = VALUE_COLUMNS + ['cpu_usage_ratio', 'memory_usage_ratio']
+# Uso/request abaixo disso conta como reserva sobrando; acima do outro, faltando
+OVER_PROVISIONED_RATIO = 0.5
+UNDER_PROVISIONED_RATIO = 1.0
+
+def iter_pods(v1, page_size=PAGE_SIZE, list_metadata=None, request_timeout=None):
+    """
+    Lista os pods de todos os namespaces página por página (limit/_continue),
+    lendo o JSON cru da API (_preload_content=False) em vez de montar os
+    modelos V1Pod do cliente. Só os campos usados pelo relatório são
+    mantidos de cada pod.
+
+    Se list_metadata for um dicionário, recebe os metadados da listagem
+    (resourceVersion), usados para iniciar um watch a partir dela.
+    request_timeout (segundos) limita cada requisição.
+    """
+    continue_token = None
+    while True:
+        kwargs = {'limit': page_size, '_preload_content': False}
+        if request_timeout:
+            kwargs['_request_timeout'] = request_timeout
+        if continue_token:
+            kwargs['_continue'] = continue_token
+        response = v1.list_pod_for_all_namespaces(**kwargs)
+        try:
+            page = json.loads(response.data)
+        finally:
+            response.release_conn()
+
+        if list_metadata is not None and not continue_token:
+            list_metadata.update(page.get('metadata', {}))
+
+        for pod in page.get('items', []):
+            yield project_pod(pod)
+
+        continue_token = page.get('metadata', {}).get('continue')
+        if not continue_token:
+            break
+
+def project_pod(pod):
+    # Mantém só metadados, nó, dono e spec.containers[].resources do pod
+    metadata = pod['metadata']
+    return {
+        'namespace': metadata['namespace'],
+        'pod': metadata['name'],
+        'node': pod.get('spec', {}).get('nodeName') or '<pendente>',
+        'owner': pod_owner(metadata),
+        'containers': [
+            {
+                'name': container['name'],
+                'requests': (container.get('resources') or {}).get('requests') or {},
+                'limits': (container.get('resources') or {}).get('limits') or {}
+            }
+            for container in pod.get('spec', {}).get('containers') or []
+        ]
+    }
+
+def pod_owner(metadata):
+    """
+    Workload dono do pod, a partir do ownerReference controlador. Pods de
+    ReplicaSet são atribuídos ao Deployment (nome sem o pod-template-hash).
+    """
+    references = metadata.get('ownerReferences') or []
+    owner = next((ref for ref in references if ref.get('controller')), references[0] if references else None)
+    if owner is None:
+        return f"{metadata['namespace']}/Pod/{metadata['name']}"
+
+    kind, name = owner['kind'], owner['name']
+    template_hash = (metadata.get('labels') or {}).get('pod-template-hash')
+    if kind == 'ReplicaSet' and template_hash and name.endswith(f'-{template_hash}'):
+        kind, name = 'Deployment', name[:-len(template_hash) - 1]
+    return f"{metadata['namespace']}/{kind}/{name}"
+
+def get_pod_usage(custom_api, request_timeout=None):
+    """
+    Lê o uso real de CPU e memória dos containers na API metrics.k8s.io
+    (metrics-server) e devolve um dicionário (namespace, pod, container) ->
+    uso, usado como tabela hash na junção com os pods. Retorna None se a API
+    de métricas não estiver disponível.
+    """
+    try:
+        kwargs = {'_request_timeout': request_timeout} if request_timeout else {}
+        response = custom_api.list_cluster_custom_object(
+            'metrics.k8s.io', 'v1beta1', 'pods', _preload_content=False, **kwargs
+        )
+        try:
+            page = json.loads(response.data)
+        finally:
+            response.release_conn()
+    except Exception as e:
+        print(f"Aviso: métricas de uso indisponíveis (metrics-server instalado?): {e}")
+        return None
+
+    usage = {}
+    for item in page.get('items', []):
+        namespace, pod = item['metadata']['namespace'], item['metadata']['name']
+        for container in item.get('containers') or []:
+            usage[(namespace, pod, container['name'])] = {
+                'cpu': convert_cpu_to_millicores(container['usage'].get('cpu', '0')),
+                'memory': parse_quantity(container['usage'].get('memory', '0'))
+            }
+    return usage
+
+def build_table(pods, usage=None, cluster='', table=None):
+    """
+    Carrega os containers dos pods em uma ContainerTable (colunar), com o
+    uso real juntado por (namespace, pod, container). Com table, acrescenta
+    os containers a uma tabela existente (um cluster por vez).
+
+    Os containers são acumulados em blocos de BUILD_CHUNK_SIZE, e as
+    quantidades de request/limit de cada bloco são convertidas coluna a
+    coluna com parse_quantities.
+    """
+    table = table if table is not None else ContainerTable()
+    chunk = []
+    for pod in pods:
+        for container in pod['containers']:
+            chunk.append((pod, container))
+            if len(chunk) >= BUILD_CHUNK_SIZE:
+                _append_containers(table, chunk, usage, cluster)
+                chunk = []
+    if chunk:
+        _append_containers(table, chunk, usage, cluster)
+    return table
+
+def _append_containers(table, chunk, usage, cluster):
+    quantities = {
+        column: parse_quantities([container[field].get(resource, '0') for _, container in chunk])
+        for column, field, resource in QUANTITY_COLUMNS
+    }
+    for column in ('cpu_request', 'cpu_limit'):
+        quantities[column] = np.rint(quantities[column] * 1000)
+
+    for i, (pod, container) in enumerate(chunk):
+        container_usage = usage.get((pod['namespace'], pod['pod'], container['name'])) if usage else None
+        values = {column: quantities[column][i] for column, _, _ in QUANTITY_COLUMNS}
+        values['cpu_usage'] = container_usage['cpu'] if container_usage else 0
+        values['memory_usage'] = container_usage['memory'] if container_usage else 0
+        table.append(
+            {
+                'cluster': cluster,
+                'namespace': pod['namespace'],
+                'pod': pod['pod'],
+                'container': container['name'],
+                'node': pod['node'],
+                'owner': pod['owner']
+            },
+            values,
+            container_usage is not None
+        )
+
+def _format(value, fmt):
+    return 'N/A' if value != value else format(value, fmt)
+
+def print_report(table, group_by='pod', sort_by='cpu_request', top=TOP_N, with_usage=True):
+    # Imprime os top-N grupos e o resumo de sobra/falta de reserva
+    rollup = table.rollup(group_by)
+    indexes = top_n(rollup, sort_by, top)
+
+    headers = [
+        GROUP_LABELS[group_by], 'Containers', 'CPU Request (cores)', 'CPU Limit (cores)', 'CPU Uso (cores)',
+        'Mem Request (MiB)', 'Mem Limit (MiB)', 'Mem Uso (MiB)', 'CPU Uso/Request', 'Mem Uso/Request'
+    ]
+    table_data = [[
+        rollup['label'][i],
+        rollup['containers'][i],
+        f"{rollup['cpu_request'][i]/1000:.2f}",
+        f"{rollup['cpu_limit'][i]/1000:.2f}",
+        _format(rollup['cpu_usage'][i] / 1000 if rollup['has_usage'][i] else float('nan'), '.2f'),
+        f"{rollup['memory_request'][i]/MIB:.0f}",
+        f"{rollup['memory_limit'][i]/MIB:.0f}",
+        _format(rollup['memory_usage'][i] / MIB if rollup['has_usage'][i] else float('nan'), '.0f'),
+        _format(rollup['cpu_usage_ratio'][i], '.2f'),
+        _format(rollup['memory_usage_ratio'][i], '.2f')
+    ] for i in indexes]
+
+    shown = f"Top {len(indexes)} de {len(rollup['label'])}" if top and top < len(rollup['label']) else 'Todos os'
+    print(f"\n{shown} grupos por {GROUP_LABELS[group_by].lower()}, ordenados por {sort_by} (decrescente):")
+    print(tabulate(table_data, headers=headers, tablefmt='grid'))
+
+    # Resumo de sobra e falta de reserva (uso/request) por pod
+    if with_usage:
+        pods = table.rollup('pod') if group_by != 'pod' else rollup
+        for resource, label in (('cpu', 'CPU'), ('memory', 'Memória')):
+            ratios = pods[f'{resource}_usage_ratio']
+            ratios = ratios[~np.isnan(ratios)]
+            over = int(np.count_nonzero(ratios < OVER_PROVISIONED_RATIO))
+            under = int(np.count_nonzero(ratios > UNDER_PROVISIONED_RATIO))
+            print(f"{label}: {over} pods usam menos de {OVER_PROVISIONED_RATIO:.0%} do request, "
+                  f"{under} usam mais de {UNDER_PROVISIONED_RATIO:.0%}")
+
+def collect_cluster(client_factory, page_size=PAGE_SIZE, with_metrics=True, request_timeout=None):
+    # Pods e uso de um cluster, com um ApiClient próprio
+    api_client = client_factory()
+    usage = get_pod_usage(client.CustomObjectsApi(api_client), request_timeout) if with_metrics else None
+    pods = list(iter_pods(client.CoreV1Api(api_client), page_size, request_timeout=request_timeout))
+    return pods, usage
+
+def collect_clusters(clusters, page_size=PAGE_SIZE, with_metrics=True, cluster_timeout=CLUSTER_TIMEOUT_SECONDS):
+    """
+    Consulta os clusters ao mesmo tempo, uma thread por cluster, e junta os
+    containers em uma só tabela com a coluna cluster. Clusters que falham
+    ou não respondem em cluster_timeout segundos ficam de fora e são
+    listados em erros, sem atrasar os demais.
+
+    As threads são daemon: um cluster travado não impede o script de
+    terminar.
+    """
+    results = {}
+
+    def run(name, client_factory):
+        try:
+            results[name] = collect_cluster(client_factory, page_size, with_metrics, cluster_timeout)
+        except Exception as e:
+            results[name] = e
+
+    threads = []
+    for name, client_factory in clusters:
+        thread = threading.Thread(target=run, args=(name, client_factory), daemon=True)
+        thread.start()
+        threads.append((name, thread))
+
+    deadline = time.monotonic() + cluster_timeout
+    table = ContainerTable()
+    errors = {}
+    with_usage = False
+    for name, thread in threads:
+        thread.join(max(deadline - time.monotonic(), 0))
+        result = results.get(name)
+        if thread.is_alive() or result is None:
+            errors[name] = f'sem resposta em {cluster_timeout}s'
+        elif isinstance(result, Exception):
+            errors[name] = str(result)
+        else:
+            pods, usage = result
+            with_usage = with_usage or usage is not None
+            build_table(pods, usage, name, table)
+    return table, errors, with_usage
+
+def get_pods_cpu_allocation(page_size=PAGE_SIZE, with_metrics=True, group_by='pod', sort_by='cpu_request',
+                            top=TOP_N, export_path=None, clusters=None, cluster_timeout=CLUSTER_TIMEOUT_SECONDS):
+    """
+    Relatório de um cluster (contexto atual do kubectl) ou, com clusters
+    (pares nome/fábrica de ApiClient, ver clusters.py), de vários clusters
+    consultados ao mesmo tempo.
+    """
+    if clusters is not None:
+        try:
+            table, errors, with_usage = collect_clusters(clusters, page_size, with_metrics, cluster_timeout)
+            print(f"{len(clusters) - len(errors)} de {len(clusters)} clusters consultados")
+            for name, error in errors.items():
+                print(f"❌ Cluster {name}: {error}")
+            print_report(table, group_by, sort_by, top, with_usage)
+            if export_path:
+                export_table(table, export_path)
+                print(f"{len(table)} containers exportados para {export_path}")
+        except Exception as e:
+            print(f"Erro ao consultar os clusters: {e}")
+        return
 
-def get_pods_cpu_allocation():
     # Carrega a configuração do kubectl
     try:
         config.load_kube_config()
@@ -15,73 +323,251 @@ def get_pods_cpu_allocation():
     v1 = client.CoreV1Api()
     
     try:
-        # Lista todos os pods em todos os namespaces
-        pods = v1.list_pod_for_all_namespaces(watch=False)
-        
-        # Lista para armazenar informações dos pods
-        pod_resources = []
-        
-        for pod in pods.items:
-            namespace = pod.metadata.namespace
-            pod_name = pod.metadata.name
-            
-            # Inicializa as variáveis de CPU
-            total_cpu_request = 0
-            total_cpu_limit = 0
-            
-            # Soma os recursos de todos os containers no pod
-            if pod.spec.containers:
-                for container in pod.spec.containers:
-                    if container.resources and container.resources.requests:
-                        cpu_request = container.resources.requests.get('cpu', '0')
-                        total_cpu_request += convert_cpu_to_millicores(cpu_request)
-                    
-                    if container.resources and container.resources.limits:
-                        cpu_limit = container.resources.limits.get('cpu', '0')
-                        total_cpu_limit += convert_cpu_to_millicores(cpu_limit)
-            
-            pod_resources.append({
-                'namespace': namespace,
-                'pod': pod_name,
-                'cpu_request': total_cpu_request,
-                'cpu_limit': total_cpu_limit
-            })
-        
-        # Ordena os pods por CPU request (decrescente)
-        sorted_pods = sorted(pod_resources, key=itemgetter('cpu_request'), reverse=True)
+        # Uso real por container, indexado por (namespace, pod, container)
+        usage = get_pod_usage(client.CustomObjectsApi()) if with_metrics else None
+
+        # Lista os pods de todos os namespaces, página por página, direto
+        # para a tabela colunar
+        table = build_table(iter_pods(v1, page_size), usage)
+
+        print_report(table, group_by, sort_by, top, usage is not None)
+
+        if export_path:
+            export_table(table, export_path)
+            print(f"{len(table)} containers exportados para {export_path}")
         
-        # Formata os resultados para exibição
-        headers = ['Namespace', 'Pod', 'CPU Request (cores)', 'CPU Limit (cores)']
+    except Exception as e:
+        print(f"Erro ao listar pods: {e}")
+
+def pod_contribution(pod):
+    # Totais de request/limit de um pod (já projetado) para o PodIndex
+    totals = {'namespace': pod['namespace'], 'node': pod['node']}
+    totals.update(dict.fromkeys(LIVE_COLUMNS, 0))
+    for container in pod['containers']:
+        totals['cpu_request'] += convert_cpu_to_millicores(container['requests'].get('cpu', '0'))
+        totals['cpu_limit'] += convert_cpu_to_millicores(container['limits'].get('cpu', '0'))
+        totals['memory_request'] += parse_quantity(container['requests'].get('memory', '0'))
+        totals['memory_limit'] += parse_quantity(container['limits'].get('memory', '0'))
+    return totals
+
+def load_index(v1, index, page_size=PAGE_SIZE):
+    # Listagem completa inicial (ou após o resourceVersion expirar)
+    list_metadata = {}
+    index.clear()
+    for pod in iter_pods(v1, page_size, list_metadata):
+        index.upsert((pod['namespace'], pod['pod']), pod_contribution(pod))
+    index.resource_version = list_metadata.get('resourceVersion')
+
+def iter_watch_events(v1, resource_version, timeout_seconds=WATCH_TIMEOUT_SECONDS):
+    # Eventos do watch como JSON cru, com bookmarks para avançar o resourceVersion
+    response = v1.list_pod_for_all_namespaces(
+        watch=True,
+        resource_version=resource_version,
+        allow_watch_bookmarks=True,
+        timeout_seconds=timeout_seconds,
+        _preload_content=False
+    )
+    try:
+        for line in iter_resp_lines(response):
+            if line.strip():
+                yield json.loads(line)
+    finally:
+        response.release_conn()
+
+def watch_pods(v1, index, page_size=PAGE_SIZE, stop=None, timeout_seconds=WATCH_TIMEOUT_SECONDS):
+    """
+    Mantém o índice atualizado: uma listagem inicial e depois o watch a
+    partir do resourceVersion dela. Cada conexão do watch dura até
+    timeout_seconds e é reaberta do último resourceVersion visto (eventos
+    ou bookmarks). Só um 410 Gone (resourceVersion expirado) refaz a
+    listagem; outros erros da API e quedas de conexão reabrem o watch do
+    mesmo ponto, com backoff exponencial.
+    """
+    needs_list = True
+    failures = 0
+    while stop is None or not stop.is_set():
+        try:
+            if needs_list:
+                load_index(v1, index, page_size)
+                needs_list = False
+            for event in iter_watch_events(v1, index.resource_version, timeout_seconds):
+                pod = event['object']
+                if event['type'] == 'ERROR':
+                    if pod.get('code') == 410:
+                        needs_list = True
+                        break
+                    raise ApiException(status=pod.get('code'), reason=pod.get('message'))
+
+                if event['type'] == 'DELETED':
+                    index.delete((pod['metadata']['namespace'], pod['metadata']['name']))
+                elif event['type'] in ('ADDED', 'MODIFIED'):
+                    index.upsert((pod['metadata']['namespace'], pod['metadata']['name']),
+                                 pod_contribution(project_pod(pod)))
+                index.resource_version = pod['metadata'].get('resourceVersion', index.resource_version)
+                failures = 0
+        except ApiException as e:
+            if e.status == 410:
+                needs_list = True
+                continue
+            failures = _watch_backoff(f"{e.status} {e.reason}", failures, stop)
+        except (ConnectionFailure, ValueError) as e:
+            # Queda de conexão, timeout de leitura ou evento cortado no meio
+            failures = _watch_backoff(str(e), failures, stop)
+
+def _watch_backoff(error, failures, stop=None):
+    failures += 1
+    delay = min(WATCH_BACKOFF_MAX_SECONDS, 2 ** failures) * random.uniform(0.5, 1.0)
+    print(f"Watch interrompido ({error}), reconectando em {delay:.0f}s...")
+    if stop is not None:
+        stop.wait(delay)
+    else:
+        time.sleep(delay)
+    return failures
+
+def print_live_rollups(index, top=TOP_N):
+    # Tabelas por namespace e por nó, montadas a partir dos agregados
+    for group in LIVE_GROUPS:
+        rollup = index.rollup(group)
+        rows = sorted(rollup.items(), key=lambda item: item[1]['cpu_request'], reverse=True)[:top or None]
         table_data = [[
-            pod['namespace'],
-            pod['pod'],
-            f"{pod['cpu_request']/1000:.2f}",
-            f"{pod['cpu_limit']/1000:.2f}"
-        ] for pod in sorted_pods]
-        
-        print("\nPods ordenados por CPU Request (decrescente):")
+            label,
+            totals['pods'],
+            f"{totals['cpu_request']/1000:.2f}",
+            f"{totals['cpu_limit']/1000:.2f}",
+            f"{totals['memory_request']/MIB:.0f}",
+            f"{totals['memory_limit']/MIB:.0f}"
+        ] for label, totals in rows]
+        headers = [GROUP_LABELS[group], 'Pods', 'CPU Request (cores)', 'CPU Limit (cores)',
+                   'Mem Request (MiB)', 'Mem Limit (MiB)']
         print(tabulate(table_data, headers=headers, tablefmt='grid'))
-        
+
+def run_live(page_size=PAGE_SIZE, refresh_seconds=REFRESH_SECONDS, prometheus_port=None, top=TOP_N):
+    """
+    Modo contínuo: mantém o índice pelo watch e mostra os agregados a cada
+    refresh_seconds (refresh_seconds=0 desliga a tabela) e/ou os serve em
+    /metrics no formato do Prometheus.
+    """
+    try:
+        config.load_kube_config()
     except Exception as e:
-        print(f"Erro ao listar pods: {e}")
+        print(f"Erro ao carregar configuração do kubectl: {e}")
+        return
+
+    v1 = client.CoreV1Api()
+    index = PodIndex()
+    stop = threading.Event()
+
+    if prometheus_port:
+        serve_prometheus(index, prometheus_port)
+        print(f"Métricas disponíveis em http://localhost:{prometheus_port}/metrics")
+
+    def refresh_loop():
+        while not stop.wait(refresh_seconds):
+            print(f"\n{len(index)} pods, {index.events} eventos, resourceVersion {index.resource_version}")
+            print_live_rollups(index, top)
+
+    if refresh_seconds:
+        threading.Thread(target=refresh_loop, daemon=True).start()
+
+    try:
+        watch_pods(v1, index, page_size, stop)
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print(f"Erro no watch de pods: {e}")
+    finally:
+        stop.set()
+
+@lru_cache(maxsize=4096)
+def parse_quantity(quantity):
+    """
+    Converte uma quantidade do Kubernetes para a unidade base (cores ou
+    bytes). Aceita sufixos binários (Ki, Mi, Gi...), decimais (n, u, m, k,
+    M, G...) e expoentes (1e3, 5E-1). Quantidades inválidas valem 0.
+    Exemplos: '100m' -> 0.1, '128Mi' -> 134217728, '1e3' -> 1000
+
+    Os resultados ficam em cache: um cluster tem poucos valores distintos
+    de request/limit, então cada um é interpretado uma só vez.
+    """
+    if quantity is None or quantity == '':
+        return 0
+    if isinstance(quantity, (int, float)):
+        return quantity
+    match = QUANTITY_PATTERN.match(str(quantity).strip())
+    if not match:
+        return 0
+    number, exponent, suffix = match.groups()
+    value = Decimal(number)
+    if exponent:
+        value *= Decimal(10) ** int(exponent[1:])
+    elif suffix in BINARY_SUFFIXES:
+        value *= BINARY_SUFFIXES[suffix]
+    else:
+        value *= DECIMAL_SUFFIXES[suffix or '']
+    return float(value)
+
+def parse_quantities(quantities):
+    """
+    parse_quantity aplicado a uma coluna inteira, devolvendo um array
+    float64. Os textos são codificados como dicionário (np.unique com
+    return_inverse): cada valor distinto é interpretado uma vez e o
+    resultado é espalhado para todas as linhas por indexação.
+    """
+    if not len(quantities):
+        return np.zeros(0)
+    distinct, inverse = np.unique(np.asarray(quantities, dtype=str), return_inverse=True)
+    parsed = np.fromiter((parse_quantity(quantity) for quantity in distinct), dtype=np.float64, count=len(distinct))
+    return parsed[inverse]
 
 def convert_cpu_to_millicores(cpu_str):
     """ 
     Converte diferentes formatos de CPU para millicores
-    Exemplos: '100m' -> 100, '0.1' -> 100, '1' -> 1000
+    Exemplos: '100m' -> 100, '0.1' -> 100, '1' -> 1000, '250000000n' -> 250
     """
-    if not cpu_str:
-        return 0
-    
-    try:
-        if isinstance(cpu_str, str):
-            if cpu_str.endswith('m'):
-                return int(cpu_str[:-1])
-            else:
-                return int(float(cpu_str) * 1000)
-        return int(cpu_str * 1000)
-    except (ValueError, TypeError):
-        return 0
+    return int(round(parse_quantity(cpu_str) * 1000))
 
 if __name__ == "__main__":
-    get_pods_cpu_allocation()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Lista o uso de recursos do cluster por pod, namespace, nó ou workload')
+    parser.add_argument('--page-size', type=int, default=PAGE_SIZE,
+                        help=f'Pods por página na listagem da API (padrão: {PAGE_SIZE})')
+    parser.add_argument('--no-metrics', action='store_true',
+                        help='Não consulta o uso real na API metrics.k8s.io')
+    parser.add_argument('--group-by', choices=list(GROUP_LABELS), default='pod',
+                        help='Agrupamento do relatório (padrão: pod)')
+    parser.add_argument('--sort-by', choices=SORT_COLUMNS, default='cpu_request',
+                        help='Coluna usada para ordenar os grupos (padrão: cpu_request)')
+    parser.add_argument('--top', type=int, default=TOP_N,
+                        help=f'Quantidade de grupos mostrados; 0 mostra todos (padrão: {TOP_N})')
+    parser.add_argument('--export',
+                        help='Exporta uma linha por container para um arquivo .csv ou .parquet')
+    parser.add_argument('--watch', action='store_true',
+                        help='Modo contínuo: acompanha os pods pelo watch e mostra os agregados por namespace e nó')
+    parser.add_argument('--refresh-seconds', type=int, default=REFRESH_SECONDS,
+                        help=f'Intervalo entre as tabelas no modo --watch; 0 desliga (padrão: {REFRESH_SECONDS})')
+    parser.add_argument('--prometheus-port', type=int,
+                        help='No modo --watch, serve os agregados em /metrics nessa porta')
+    parser.add_argument('--contexts',
+                        help='Contextos do kubeconfig consultados ao mesmo tempo, separados por vírgula '
+                             '("all" usa todos)')
+    parser.add_argument('--eks-regions',
+                        help='Descobre os clusters EKS dessas regiões (separadas por vírgula) com list_clusters')
+    parser.add_argument('--cluster-timeout', type=int, default=CLUSTER_TIMEOUT_SECONDS,
+                        help=f'Tempo máximo por cluster, em segundos (padrão: {CLUSTER_TIMEOUT_SECONDS})')
+    args = parser.parse_args()
+    if args.watch and (args.contexts or args.eks_regions):
+        parser.error('--watch acompanha só o contexto atual do kubeconfig; não use com --contexts ou --eks-regions')
+
+    clusters = None
+    if args.contexts:
+        contexts = [] if args.contexts == 'all' else [c.strip() for c in args.contexts.split(',') if c.strip()]
+        clusters = context_clusters(contexts)
+    if args.eks_regions:
+        regions = [r.strip() for r in args.eks_regions.split(',') if r.strip()]
+        clusters = (clusters or []) + eks_clusters(regions)
+
+    if args.watch:
+        run_live(args.page_size, args.refresh_seconds, args.prometheus_port, args.top)
+        raise SystemExit
+
+    get_pods_cpu_allocation(args.page_size, not args.no_metrics, args.group_by, args.sort_by,
+                            args.top or None, args.export, clusters, args.cluster_timeout)
@@ -0,0 +1,114 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+
+# Totais por pod mantidos no índice: CPU em millicores, memória em bytes
+LIVE_COLUMNS = ['cpu_request', 'cpu_limit', 'memory_request', 'memory_limit']
+LIVE_GROUPS = ['namespace', 'node']
+
+
+class PodIndex:
+    """
+    Índice em memória dos pods do cluster, atualizado pelos eventos do watch.
+
+    Guarda a contribuição de cada pod (namespace, nó e totais de
+    request/limit) e os agregados por namespace e por nó. Cada evento
+    subtrai a contribuição antiga do pod e soma a nova, então o custo de
+    manter os agregados é proporcional ao número de mudanças, e não ao
+    tamanho do cluster.
+    """
+
+    def __init__(self):
+        self.resource_version = None
+        self.events = 0
+        self._pods = {}
+        self._aggregates = {group: {} for group in LIVE_GROUPS}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pods)
+
+    def _add(self, contribution, sign):
+        for group in LIVE_GROUPS:
+            totals = self._aggregates[group].setdefault(
+                contribution[group], dict.fromkeys(LIVE_COLUMNS + ['pods'], 0)
+            )
+            totals['pods'] += sign
+            for column in LIVE_COLUMNS:
+                totals[column] += sign * contribution[column]
+            if totals['pods'] == 0:
+                del self._aggregates[group][contribution[group]]
+
+    def upsert(self, key, contribution):
+        with self._lock:
+            previous = self._pods.get(key)
+            if previous is not None:
+                self._add(previous, -1)
+            self._pods[key] = contribution
+            self._add(contribution, 1)
+            self.events += 1
+
+    def delete(self, key):
+        with self._lock:
+            previous = self._pods.pop(key, None)
+            if previous is not None:
+                self._add(previous, -1)
+            self.events += 1
+
+    def clear(self):
+        # Usado antes de uma nova listagem completa (resourceVersion expirado)
+        with self._lock:
+            self._pods.clear()
+            self._aggregates = {group: {} for group in LIVE_GROUPS}
+
+    def rollup(self, group):
+        # Cópia dos agregados de um grupo: {rótulo: {coluna: total}}
+        with self._lock:
+            return {label: dict(totals) for label, totals in self._aggregates[group].items()}
+
+
+def render_prometheus(index):
+    """
+    Agregados no formato de texto do Prometheus: uma métrica por coluna,
+    com o namespace ou o nó como label. CPU em cores, memória em bytes.
+    """
+    lines = []
+    for group in LIVE_GROUPS:
+        rollup = index.rollup(group)
+        for column in LIVE_COLUMNS + ['pods']:
+            name = f'eks_{group}_{column}' + ('_cores' if column.startswith('cpu') else
+                                             '_bytes' if column.startswith('memory') else '')
+            lines.append(f'# TYPE {name} gauge')
+            for label, totals in sorted(rollup.items()):
+                value = totals[column] / 1000 if column.startswith('cpu') else totals[column]
+                escaped = str(label).replace('\\', '\\\\').replace('"', '\\"')
+                lines.append(f'{name}{{{group}="{escaped}"}} {float(value)!r}')
+    lines.append('# TYPE eks_watch_pods gauge')
+    lines.append(f'eks_watch_pods {len(index)}')
+    lines.append('# TYPE eks_watch_events_total counter')
+    lines.append(f'eks_watch_events_total {index.events}')
+    return '\n'.join(lines) + '\n'
+
+
+def serve_prometheus(index, port):
+    """
+    Serve /metrics em uma thread em segundo plano. Cada requisição monta o
+    texto a partir dos agregados, sem percorrer os pods.
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+            body = render_prometheus(index).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('', port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,161 @@
+from array import array
+import csv
+
+import numpy as np
+
+# Colunas numéricas por container: CPU em millicores, memória em bytes
+VALUE_COLUMNS = ['cpu_request', 'cpu_limit', 'cpu_usage', 'memory_request', 'memory_limit', 'memory_usage']
+# Colunas de texto, guardadas como códigos inteiros (dictionary encoding)
+KEY_COLUMNS = ['cluster', 'namespace', 'pod', 'container', 'node', 'owner']
+# Chaves que identificam cada grupo; o nome do pod só é único no namespace
+GROUP_KEYS = {
+    'pod': ['namespace', 'pod'],
+    'container': ['namespace', 'pod', 'container']
+}
+
+
+class ContainerTable:
+    """
+    Armazena os recursos de cada container em colunas (arrays NumPy) em vez
+    de uma lista de dicionários. Os textos (namespace, pod, nó, workload)
+    viram códigos inteiros, então os agrupamentos são somas com np.bincount
+    e o top-N usa np.argpartition, sem ordenar a tabela inteira.
+
+    As linhas são acumuladas com append() em arrays compactos do módulo
+    array e copiadas para NumPy na primeira consulta após uma alteração.
+    """
+
+    def __init__(self):
+        self._labels = {key: {} for key in KEY_COLUMNS}
+        self._codes = {key: array('i') for key in KEY_COLUMNS}
+        self._values = {column: array('d') for column in VALUE_COLUMNS}
+        self._has_usage = array('b')
+        self._frozen = None
+
+    def __len__(self):
+        return len(self._has_usage)
+
+    def append(self, keys, values, has_usage):
+        for key in KEY_COLUMNS:
+            labels = self._labels[key]
+            self._codes[key].append(labels.setdefault(keys[key], len(labels)))
+        for column in VALUE_COLUMNS:
+            self._values[column].append(values.get(column, 0))
+        self._has_usage.append(bool(has_usage))
+        self._frozen = None
+
+    def _columns(self):
+        if self._frozen is None:
+            self._frozen = {
+                'codes': {key: np.array(self._codes[key], dtype=np.intc) for key in KEY_COLUMNS},
+                'values': {column: np.array(self._values[column], dtype=np.float64) for column in VALUE_COLUMNS},
+                'has_usage': np.array(self._has_usage, dtype=np.int8),
+                'labels': {key: np.array(list(self._labels[key]), dtype=object) for key in KEY_COLUMNS}
+            }
+        return self._frozen
+
+    def _group(self, keys):
+        """
+        Combina os códigos de várias chaves em um código por grupo
+        (np.unique) e monta os rótulos "chave1/chave2/...".
+        """
+        columns = self._columns()
+        sizes = [max(len(self._labels[key]), 1) for key in keys]
+        combined = np.zeros(len(self), dtype=np.int64)
+        for key, size in zip(keys, sizes):
+            combined = combined * size + columns['codes'][key]
+        unique, codes = np.unique(combined, return_inverse=True)
+
+        parts = []
+        for key, size in reversed(list(zip(keys, sizes))):
+            parts.append(columns['labels'][key][unique % size])
+            unique = unique // size
+        labels = np.array(['/'.join(map(str, group)) for group in zip(*reversed(parts))], dtype=object)
+        return codes, labels
+
+    def rollup(self, by):
+        """
+        Soma as colunas por cluster, namespace, nó, workload (owner), pod ou
+        container. Com mais de um cluster na tabela, os grupos (exceto o
+        próprio cluster) são separados por cluster.
+        """
+        columns = self._columns()
+        keys = GROUP_KEYS.get(by, [by])
+        if by != 'cluster' and len(self._labels['cluster']) > 1:
+            keys = ['cluster'] + keys
+        if len(keys) == 1:
+            codes, labels = columns['codes'][by], columns['labels'][by]
+        else:
+            codes, labels = self._group(keys)
+
+        size = len(labels)
+        result = {
+            'label': labels,
+            'containers': np.bincount(codes, minlength=size),
+            'has_usage': np.bincount(codes, weights=columns['has_usage'], minlength=size) > 0
+        }
+        for column in VALUE_COLUMNS:
+            result[column] = np.bincount(codes, weights=columns['values'][column], minlength=size)
+        for resource in ('cpu', 'memory'):
+            request = result[f'{resource}_request']
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ratio = np.where(request > 0, result[f'{resource}_usage'] / request, np.nan)
+            result[f'{resource}_usage_ratio'] = np.where(result['has_usage'], ratio, np.nan)
+        return result
+
+    def to_columns(self):
+        """
+        Colunas completas, uma posição por container: textos decodificados e
+        uso ausente (sem métricas) como NaN.
+        """
+        columns = self._columns()
+        result = {key: columns['labels'][key][columns['codes'][key]] for key in KEY_COLUMNS}
+        has_usage = columns['has_usage'].astype(bool)
+        for column in VALUE_COLUMNS:
+            values = columns['values'][column]
+            result[column] = np.where(has_usage, values, np.nan) if column.endswith('_usage') else values
+        return result
+
+
+def top_n(rollup, column, n):
+    """
+    Índices dos n grupos com maior valor na coluna, em ordem decrescente.
+    np.argpartition separa os n maiores em O(grupos) e só eles são
+    ordenados. Valores ausentes (NaN) ficam por último.
+    """
+    values = np.nan_to_num(rollup[column], nan=-np.inf)
+    if n is None or n >= len(values):
+        return np.argsort(-values, kind='stable')
+    candidates = np.argpartition(-values, n - 1)[:n]
+    return candidates[np.argsort(-values[candidates], kind='stable')]
+
+
+def export_table(table, path):
+    """
+    Exporta uma linha por container em CSV ou Parquet, conforme a extensão
+    do arquivo. Parquet requer o pacote pyarrow, importado só nesse caso.
+    """
+    fieldnames = KEY_COLUMNS + VALUE_COLUMNS
+    columns = table.to_columns()
+    if path.endswith('.parquet'):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError('A exportação em parquet requer o pacote pyarrow (pip install pyarrow)')
+        arrays = {
+            name: pyarrow.array(columns[name], from_pandas=True) if name in VALUE_COLUMNS
+            else pyarrow.array(columns[name].tolist(), type=pyarrow.string())
+            for name in fieldnames
+        }
+        pyarrow.parquet.write_table(pyarrow.table(arrays), path)
+        return
+
+    with open(path, 'w', newline='', encoding='utf-8') as export_file:
+        writer = csv.writer(export_file)
+        writer.writerow(fieldnames)
+        # Uso ausente (NaN) sai como campo vazio
+        writer.writerows(zip(*[
+            ['' if value != value else value for value in columns[name].tolist()]
+            for name in fieldnames
+        ]))
@@ -0,0 +1,394 @@
+# Shared core of the start_rds/stop_rds Lambdas. Package this file together
+# with them.
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import random
+import time
+
+DEFAULT_WORKERS = 16
+# Regions/accounts processed at the same time by run_fleet
+DEFAULT_TARGET_WORKERS = 8
+
+# What to do with a resource in each status, per action. A method name
+# means the resource is started/stopped with that API call; a message means
+# it is skipped.
+TRANSITIONS = {
+    'start': {
+        'available': '{kind} {id} is already available',
+        'stopped': 'start',
+        'starting': '{kind} {id} is already in starting state',
+        'stopping': '{kind} {id} is in stopping state. Please wait before starting',
+    },
+    'stop': {
+        'available': 'stop',
+        'stopped': '{kind} {id} is already stopped',
+        'starting': '{kind} {id} is in starting state. Please stop it after starting is complete',
+        'stopping': '{kind} {id} is already in stopping state',
+    },
+}
+DONE_MESSAGES = {'start': 'Started {kind} {id}', 'stop': 'Stopping {kind} {id}'}
+DONE_ACTIONS = {'start': 'started', 'stop': 'stopped'}
+
+# Convergence mode: status each action must reach, and the status a resource
+# caught mid-transition must settle in before the action can be issued
+# (e.g. a stop requested while the database is still starting)
+TARGET_STATUS = {'start': 'available', 'stop': 'stopped'}
+READY_STATUS = {'start': 'stopped', 'stop': 'available'}
+IN_FLIGHT_STATUS = {'start': 'starting', 'stop': 'stopping'}
+BLOCKED_STATUS = {'start': 'stopping', 'stop': 'starting'}
+# describe_* Filters accept at most 100 identifiers
+DESCRIBE_BATCH_SIZE = 100
+POLL_BASE_SECONDS = 5
+POLL_MAX_SECONDS = 60
+
+def create_clients(region, workers=DEFAULT_WORKERS, session=None):
+    """
+    Creates the RDS and Resource Groups Tagging clients for a region, with a
+    connection pool sized to the number of workers and adaptive retries.
+    """
+    session = session or boto3.session.Session()
+    client_config = Config(
+        max_pool_connections=max(workers, 10),
+        retries={'max_attempts': 10, 'mode': 'adaptive'}
+    )
+    return (
+        session.client('rds', region_name=region, config=client_config),
+        session.client('resourcegroupstaggingapi', region_name=region, config=client_config)
+    )
+
+def iter_db_instances(client):
+    # describe_db_instances returns at most 100 instances per call
+    for page in client.get_paginator('describe_db_instances').paginate():
+        yield from page['DBInstances']
+
+def iter_db_clusters(client):
+    for page in client.get_paginator('describe_db_clusters').paginate():
+        yield from page['DBClusters']
+
+def find_tagged_arns(tagging_client, key, value):
+    """
+    Returns the ARNs of the RDS instances and clusters tagged key=value with
+    bulk get_resources calls (100 resources per page).
+    """
+    paginator = tagging_client.get_paginator('get_resources')
+    arns = set()
+    for page in paginator.paginate(
+        TagFilters=[{'Key': key, 'Values': [value]}],
+        ResourceTypeFilters=['rds:db', 'rds:cluster']
+    ):
+        arns.update(resource['ResourceARN'] for resource in page['ResourceTagMappingList'])
+    return arns
+
+def _has_tag(client, arn, key, value):
+    tags = client.list_tags_for_resource(ResourceName=arn)['TagList']
+    return any(tag['Key'] == key and tag['Value'] == value for tag in tags)
+
+def find_tagged_arns_per_resource(client, arns, key, value, workers=DEFAULT_WORKERS):
+    # Fallback when the role cannot call the tagging API: one call per
+    # resource, made concurrently
+    arns = list(arns)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        matches = executor.map(lambda arn: _has_tag(client, arn, key, value), arns)
+        return {arn for arn, match in zip(arns, matches) if match}
+
+def collect_candidates(client):
+    """
+    Lists the instances and clusters that can be scheduled. Aurora instances
+    are started/stopped through their cluster, and instances that are or
+    have read replicas cannot be started/stopped, so they are reported and
+    left out.
+    """
+    candidates = []
+    skipped = []
+    instances = list(iter_db_instances(client))
+    read_replicas = set()
+    for instance in instances:
+        read_replicas.update(instance['ReadReplicaDBInstanceIdentifiers'])
+
+    for instance in instances:
+        identifier = instance['DBInstanceIdentifier']
+        if instance['Engine'].startswith('aurora'):
+            continue
+        if identifier in read_replicas or instance.get('ReadReplicaSourceDBInstanceIdentifier'):
+            skipped.append(_result('DB Instance', identifier, instance['DBInstanceStatus'], 'skipped',
+                                   f'DB Instance {identifier} is a Read Replica'))
+        elif instance['ReadReplicaDBInstanceIdentifiers']:
+            skipped.append(_result('DB Instance', identifier, instance['DBInstanceStatus'], 'skipped',
+                                   f'DB Instance {identifier} has a read replica. '
+                                   'Cannot start or stop a database with Read Replica'))
+        else:
+            candidates.append(('DB Instance', identifier, instance['DBInstanceStatus'], instance['DBInstanceArn']))
+
+    for cluster in iter_db_clusters(client):
+        candidates.append(('DB Cluster', cluster['DBClusterIdentifier'], cluster['Status'], cluster['DBClusterArn']))
+
+    return candidates, skipped
+
+def _result(kind, identifier, status, action, message):
+    return {'type': kind, 'identifier': identifier, 'status': status, 'action': action, 'message': message}
+
+def _issue(client, step, kind, identifier):
+    if kind == 'DB Cluster':
+        getattr(client, f'{step}_db_cluster')(DBClusterIdentifier=identifier)
+    else:
+        getattr(client, f'{step}_db_instance')(DBInstanceIdentifier=identifier)
+
+def _transition(client, action, kind, identifier, status):
+    step = TRANSITIONS[action].get(status, '{kind} {id} is in ' + status + ' state, skipping')
+    if step not in ('start', 'stop'):
+        return _result(kind, identifier, status, 'skipped', step.format(kind=kind, id=identifier))
+    try:
+        _issue(client, step, kind, identifier)
+    except ClientError as e:
+        return _result(kind, identifier, status, 'failed', f'Failed to {step} {kind} {identifier}: {e}')
+    return _result(kind, identifier, status, DONE_ACTIONS[step], DONE_MESSAGES[step].format(kind=kind, id=identifier))
+
+def describe_statuses(client, kind, identifiers):
+    """
+    Returns the status of many instances or clusters, with one describe call
+    per DESCRIBE_BATCH_SIZE identifiers (Filters) instead of one per resource.
+    """
+    if kind == 'DB Cluster':
+        operation, filter_name, items, id_key, status_key = (
+            'describe_db_clusters', 'db-cluster-id', 'DBClusters', 'DBClusterIdentifier', 'Status'
+        )
+    else:
+        operation, filter_name, items, id_key, status_key = (
+            'describe_db_instances', 'db-instance-id', 'DBInstances', 'DBInstanceIdentifier', 'DBInstanceStatus'
+        )
+    paginator = client.get_paginator(operation)
+    statuses = {}
+    for i in range(0, len(identifiers), DESCRIBE_BATCH_SIZE):
+        batch = identifiers[i:i + DESCRIBE_BATCH_SIZE]
+        for page in paginator.paginate(Filters=[{'Name': filter_name, 'Values': batch}]):
+            statuses.update((item[id_key], item[status_key]) for item in page[items])
+    return statuses
+
+def _poll_delay(attempt, remaining):
+    # Exponential backoff with jitter, never sleeping past the deadline
+    delay = min(POLL_MAX_SECONDS, POLL_BASE_SECONDS * 2 ** attempt) * random.uniform(0.5, 1.0)
+    return max(min(delay, remaining), 0)
+
+def wait_for_convergence(client, action, results, deadline, started_at):
+    """
+    Polls the scheduled resources (results of _transition) that are on their
+    way to the action's target status until all of them get there or the
+    deadline (time.monotonic()) passes.
+
+    Resources caught in the opposite transition (a start while stopping, a
+    stop while starting) are tracked too: the action is issued once they
+    settle. Each tracked result gets converged, final_status and
+    converge_seconds (since started_at).
+    """
+    tracked = {}
+    for result in results:
+        if result['action'] == DONE_ACTIONS[action] or result['status'] == IN_FLIGHT_STATUS[action]:
+            tracked[(result['type'], result['identifier'])] = (result, False)
+        elif result['action'] == 'skipped' and result['status'] == BLOCKED_STATUS[action]:
+            tracked[(result['type'], result['identifier'])] = (result, True)
+
+    attempt = 0
+    while tracked and time.monotonic() < deadline:
+        time.sleep(_poll_delay(attempt, deadline - time.monotonic()))
+        attempt += 1
+        for kind in ('DB Instance', 'DB Cluster'):
+            identifiers = [identifier for tracked_kind, identifier in tracked if tracked_kind == kind]
+            if not identifiers:
+                continue
+            for identifier, status in describe_statuses(client, kind, identifiers).items():
+                result, pending = tracked[(kind, identifier)]
+                result['final_status'] = status
+                if pending and status == READY_STATUS[action]:
+                    try:
+                        _issue(client, action, kind, identifier)
+                    except ClientError as e:
+                        result.update(action='failed', message=f'Failed to {action} {kind} {identifier}: {e}')
+                        del tracked[(kind, identifier)]
+                        continue
+                    result.update(action=DONE_ACTIONS[action],
+                                  message=DONE_MESSAGES[action].format(kind=kind, id=identifier))
+                    tracked[(kind, identifier)] = (result, False)
+                elif not pending and status == TARGET_STATUS[action]:
+                    result['converged'] = True
+                    result['converge_seconds'] = round(time.monotonic() - started_at, 1)
+                    del tracked[(kind, identifier)]
+
+    for result, _ in tracked.values():
+        result['converged'] = False
+        result['converge_seconds'] = None
+
+def issue_schedule(action, region, key, value, workers=DEFAULT_WORKERS, session=None):
+    """
+    Starts or stops (action) every RDS instance and cluster of the region
+    tagged key=value: resources are listed with pagination, tags are
+    matched in bulk with the tagging API (or concurrently per resource if
+    it is not allowed), and the start/stop calls are made in parallel.
+
+    Returns a summary with one result per resource, and the RDS client and
+    transition results that wait_for_convergence needs.
+    """
+    client, tagging_client = create_clients(region, workers, session)
+    candidates, results = collect_candidates(client)
+
+    try:
+        tagged = find_tagged_arns(tagging_client, key, value)
+        tag_lookup = 'tagging-api'
+    except ClientError:
+        tagged = find_tagged_arns_per_resource(client, [arn for _, _, _, arn in candidates], key, value, workers)
+        tag_lookup = 'per-resource'
+
+    scheduled = []
+    for kind, identifier, status, arn in candidates:
+        if arn in tagged:
+            scheduled.append((kind, identifier, status))
+        else:
+            results.append(_result(kind, identifier, status, 'skipped', f'{kind} {identifier} is not part of autoshutdown'))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        transitions = list(executor.map(lambda resource: _transition(client, action, *resource), scheduled))
+    results.extend(transitions)
+
+    return {'region': region, 'tag_lookup': tag_lookup, 'results': results}, client, transitions
+
+def _converge(summary, client, action, transitions, deadline, started_at):
+    wait_for_convergence(client, action, transitions, deadline, started_at)
+    summary['not_converged'] = sum(1 for result in transitions if result.get('converged') is False)
+
+def _count_actions(summary):
+    # Counted last, since waiting can turn a skipped resource into a started one
+    summary['counts'] = dict(Counter(result['action'] for result in summary['results']))
+    return summary
+
+def run_schedule(action, region, key, value, workers=DEFAULT_WORKERS, session=None, deadline=None):
+    """
+    Runs issue_schedule on one region and, with a deadline (time.monotonic()),
+    waits for the resources to reach the target status, see
+    wait_for_convergence.
+
+    Returns a summary with one result per resource and counts per action.
+    """
+    started_at = time.monotonic()
+    summary, client, transitions = issue_schedule(action, region, key, value, workers, session)
+    if deadline is not None:
+        _converge(summary, client, action, transitions, deadline, started_at)
+    return _count_actions(summary)
+
+def assume_role_session(role_arn, session_name='rds-scheduler'):
+    # Session with temporary credentials of a role in another account.
+    # A new Session per call: the default session is not thread-safe and
+    # run_fleet assumes roles from several threads
+    credentials = boto3.session.Session().client('sts').assume_role(
+        RoleArn=role_arn,
+        RoleSessionName=session_name
+    )['Credentials']
+    return boto3.session.Session(
+        aws_access_key_id=credentials['AccessKeyId'],
+        aws_secret_access_key=credentials['SecretAccessKey'],
+        aws_session_token=credentials['SessionToken']
+    )
+
+def _issue_target(action, role_arn, region, key, value, workers):
+    # First phase of run_fleet: returns (summary, client, transitions,
+    # started_at); client is None when the target failed
+    started_at = time.monotonic()
+    try:
+        session = assume_role_session(role_arn) if role_arn else boto3.session.Session()
+        summary, client, transitions = issue_schedule(action, region, key, value, workers, session)
+    except Exception as e:
+        summary, client, transitions = {'region': region, 'error': str(e), 'results': []}, None, []
+    summary['role_arn'] = role_arn
+    return summary, client, transitions, started_at
+
+def _converge_target(action, target, deadline):
+    summary, client, transitions, started_at = target
+    try:
+        _converge(summary, client, action, transitions, deadline, started_at)
+    except Exception as e:
+        summary['error'] = f'Failed while waiting for convergence: {e}'
+
+def run_fleet(action, regions, key, value, role_arns=None, workers=DEFAULT_WORKERS,
+              target_workers=DEFAULT_TARGET_WORKERS, deadline=None):
+    """
+    Runs the schedule on every region of every account. Each account is
+    reached by assuming one of role_arns (None, or an empty list, means the
+    Lambda's own account), and each region/account pair gets its own
+    session and clients. A failure in one target is reported in its summary
+    without stopping the others.
+
+    Runs in two phases, so waiting never delays the start/stop calls: the
+    transitions are first issued on every target (target_workers at a
+    time), then, with a deadline, all targets are polled at once until
+    their resources converge or the shared deadline passes.
+
+    Returns a JSON-serializable summary of the whole fleet.
+    """
+    targets = [(role_arn, region) for role_arn in (role_arns or [None]) for region in regions]
+    with ThreadPoolExecutor(max_workers=target_workers) as executor:
+        issued = list(executor.map(
+            lambda target: _issue_target(action, target[0], target[1], key, value, workers), targets
+        ))
+
+    waiting = [target for target in issued if target[1] is not None]
+    if deadline is not None and waiting:
+        # Polling is mostly sleeping, so each target gets its own thread
+        with ThreadPoolExecutor(max_workers=len(waiting)) as executor:
+            list(executor.map(lambda target: _converge_target(action, target, deadline), waiting))
+
+    summaries = []
+    for summary, _, _, started_at in issued:
+        summary['seconds'] = round(time.monotonic() - started_at, 2)
+        summaries.append(_count_actions(summary))
+
+    totals = Counter()
+    for summary in summaries:
+        totals.update(summary['counts'])
+    fleet = {
+        'action': action,
+        'counts': dict(totals),
+        'failed_targets': sum(1 for summary in summaries if 'error' in summary),
+        'targets': summaries
+    }
+    if deadline is not None:
+        fleet['not_converged'] = sum(summary.get('not_converged', 0) for summary in summaries)
+    return fleet
+
+def split_list(text):
+    # Comma-separated environment variable, ignoring blanks
+    return [item.strip() for item in (text or '').split(',') if item.strip()]
+
+# Time kept free at the end of the Lambda to build and return the summary
+DEADLINE_MARGIN_SECONDS = 15
+
+def handle_event(action, event, environ, context=None):
+    """
+    Lambda entry point shared by start_rds/stop_rds. Regions and role ARNs
+    come from the event ("regions", "role_arns") or from the REGIONS (or
+    REGION) and ROLE_ARNS environment variables; KEY/VALUE select the tag.
+
+    With "wait" in the event (or WAIT=true), waits for the resources to
+    converge until "wait_seconds" (or WAIT_SECONDS) pass, capped by the
+    time the Lambda has left.
+    """
+    event = event or {}
+    deadline = None
+    if event.get('wait', environ.get('WAIT', '').lower() == 'true'):
+        wait_seconds = float(event.get('wait_seconds', environ.get('WAIT_SECONDS', 600)))
+        if context is not None:
+            remaining = context.get_remaining_time_in_millis() / 1000 - DEADLINE_MARGIN_SECONDS
+            wait_seconds = min(wait_seconds, remaining)
+        deadline = time.monotonic() + wait_seconds
+    regions = event.get('regions') or split_list(environ.get('REGIONS')) or [environ['REGION']]
+    role_arns = event.get('role_arns') or split_list(environ.get('ROLE_ARNS'))
+    return run_fleet(
+        action,
+        regions,
+        event.get('key', environ['KEY']),
+        event.get('value', environ['VALUE']),
+        role_arns,
+        int(environ.get('WORKERS', DEFAULT_WORKERS)),
+        deadline=deadline
+    )
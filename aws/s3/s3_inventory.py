@@ -0,0 +1,229 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import unquote_plus
+
+# Inventory column names (CSV fileSchema and Parquet/ORC field names) mapped
+# to the keys used by list_objects_v2 entries
+CSV_COLUMNS = {
+    'Key': 'Key',
+    'Size': 'Size',
+    'LastModifiedDate': 'LastModified',
+    'StorageClass': 'StorageClass',
+    'ETag': 'ETag',
+    'IsLatest': 'IsLatest',
+    'IsDeleteMarker': 'IsDeleteMarker'
+}
+COLUMNAR_COLUMNS = {
+    'key': 'Key',
+    'size': 'Size',
+    'last_modified_date': 'LastModified',
+    'storage_class': 'StorageClass',
+    'e_tag': 'ETag',
+    'is_latest': 'IsLatest',
+    'is_delete_marker': 'IsDeleteMarker'
+}
+
+BATCH_SIZE = 10000
+
+
+def parse_s3_uri(uri: str) -> Tuple[str, str]:
+    """
+    Splits s3://bucket/key into (bucket, key).
+    """
+    bucket, _, key = uri[len('s3://'):].partition('/')
+    return bucket, key
+
+
+def _parse_timestamp(value) -> Optional[datetime]:
+    if value in (None, ''):
+        return None
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _parse_bool(value) -> bool:
+    if isinstance(value, str):
+        return value.lower() == 'true'
+    return bool(value)
+
+
+def _to_listing_entry(row: Dict) -> Optional[Dict]:
+    """
+    Turns an inventory row into a list_objects_v2 like entry. Returns None
+    for rows that do not describe the current version of an object.
+    """
+    if 'IsLatest' in row and not _parse_bool(row['IsLatest']):
+        return None
+    if 'IsDeleteMarker' in row and _parse_bool(row['IsDeleteMarker']):
+        return None
+
+    entry = {'Key': row['Key']}
+    if row.get('Size') not in (None, ''):
+        entry['Size'] = int(row['Size'])
+    last_modified = _parse_timestamp(row.get('LastModified'))
+    if last_modified:
+        entry['LastModified'] = last_modified
+    if row.get('StorageClass'):
+        entry['StorageClass'] = row['StorageClass']
+    if row.get('ETag'):
+        etag = row['ETag']
+        entry['ETag'] = etag if etag.startswith('"') else f'"{etag}"'
+    return entry
+
+
+class InventoryManifest:
+    """
+    An S3 Inventory manifest.json, loaded from a local path or an s3:// URI.
+
+    Data files are streamed from the inventory destination bucket. When the
+    manifest is local, data files are first looked up next to it, which
+    allows running against a downloaded copy of the inventory.
+    """
+
+    def __init__(self, location: str, s3_client=None):
+        self.location = location
+        self.s3_client = s3_client
+
+        if location.startswith('s3://'):
+            bucket, key = parse_s3_uri(location)
+            body = s3_client.get_object(Bucket=bucket, Key=key)['Body']
+            self.manifest = json.loads(body.read())
+            self.local_dir = None
+        else:
+            with open(location, encoding='utf-8') as manifest_file:
+                self.manifest = json.load(manifest_file)
+            self.local_dir = os.path.dirname(os.path.abspath(location))
+
+        self.source_bucket = self.manifest.get('sourceBucket')
+        self.file_format = self.manifest.get('fileFormat', 'CSV').upper()
+        # destinationBucket is an ARN (arn:aws:s3:::bucket-name)
+        self.destination_bucket = self.manifest.get('destinationBucket', '').split(':::')[-1]
+
+    @property
+    def data_files(self) -> List[str]:
+        return [entry['key'] for entry in self.manifest.get('files', [])]
+
+    @property
+    def has_last_modified(self) -> bool:
+        # LastModifiedDate is an optional inventory field; fileSchema lists the
+        # CSV columns, or the Parquet/ORC schema with the field names
+        schema = self.manifest.get('fileSchema', '')
+        if self.file_format == 'CSV':
+            return 'LastModifiedDate' in [name.strip() for name in schema.split(',')]
+        return 'last_modified_date' in schema
+
+    def _local_path(self, file_key: str) -> Optional[str]:
+        if not self.local_dir:
+            return None
+        # Synced inventories keep data/ as a sibling of the dated manifest folder
+        name = os.path.basename(file_key)
+        for candidate in (file_key, name, os.path.join('data', name), os.path.join('..', 'data', name)):
+            path = os.path.normpath(os.path.join(self.local_dir, candidate))
+            if os.path.exists(path):
+                return path
+        return None
+
+    def open_data_file(self, file_key: str):
+        """
+        Returns a binary stream for a data file of the inventory.
+        """
+        local_path = self._local_path(file_key)
+        if local_path:
+            return open(local_path, 'rb')
+        if not self.s3_client or not self.destination_bucket:
+            raise FileNotFoundError(f"Inventory data file not found: {file_key}")
+        return self.s3_client.get_object(Bucket=self.destination_bucket, Key=file_key)['Body']
+
+    def iter_objects(self) -> Iterator[Dict]:
+        """
+        Yields one list_objects_v2 like entry per object, one data file at
+        a time.
+        """
+        for file_key in self.data_files:
+            if self.file_format == 'CSV':
+                rows = self._iter_csv_rows(file_key)
+            elif self.file_format in ('PARQUET', 'ORC'):
+                rows = self._iter_columnar_rows(file_key)
+            else:
+                raise ValueError(f"Unsupported inventory format: {self.file_format}")
+
+            for row in rows:
+                entry = _to_listing_entry(row)
+                if entry:
+                    yield entry
+
+    def _iter_csv_rows(self, file_key: str) -> Iterator[Dict]:
+        columns = [
+            CSV_COLUMNS.get(name.strip())
+            for name in self.manifest['fileSchema'].split(',')
+        ]
+        with self.open_data_file(file_key) as raw:
+            stream = gzip.GzipFile(fileobj=raw) if file_key.endswith('.gz') else raw
+            text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+            for values in csv.reader(text):
+                row = {column: value for column, value in zip(columns, values) if column}
+                # Keys in CSV inventories are URL-encoded
+                row['Key'] = unquote_plus(row['Key'])
+                yield row
+
+    def _iter_columnar_rows(self, file_key: str) -> Iterator[Dict]:
+        try:
+            if self.file_format == 'PARQUET':
+                import pyarrow.parquet
+            else:
+                import pyarrow.orc
+        except ImportError:
+            raise ImportError(
+                f"Reading {self.file_format} inventories requires pyarrow (pip install pyarrow)"
+            )
+
+        local_path = self._local_path(file_key)
+        temp_path = None
+        if not local_path:
+            # Parquet and ORC readers need a seekable file
+            with tempfile.NamedTemporaryFile(delete=False) as temp_file:
+                body = self.open_data_file(file_key)
+                for chunk in iter(lambda: body.read(8 * 1024 * 1024), b''):
+                    temp_file.write(chunk)
+                temp_path = temp_file.name
+            local_path = temp_path
+
+        try:
+            if self.file_format == 'PARQUET':
+                batches = pyarrow.parquet.ParquetFile(local_path).iter_batches(batch_size=BATCH_SIZE)
+            else:
+                orc_file = pyarrow.orc.ORCFile(local_path)
+                batches = (orc_file.read_stripe(i) for i in range(orc_file.nstripes))
+
+            for batch in batches:
+                names = [COLUMNAR_COLUMNS.get(name) for name in batch.schema.names]
+                for record in batch.to_pylist():
+                    yield {
+                        column: value
+                        for column, value in zip(names, record.values())
+                        if column
+                    }
+        finally:
+            if temp_path:
+                os.remove(temp_path)
+
+
+def iter_key_file_objects(path: str) -> Iterator[Dict]:
+    """
+    Yields an entry for each non-empty line of a local file with one key per
+    line. Only the key is known: --older-than cannot be used with a key file,
+    and the size and storage class are read with a HEAD call when each key
+    is transitioned (the --plan summary reports these objects as 0 bytes).
+    """
+    with open(path, encoding='utf-8') as key_file:
+        for line in key_file:
+            key = line.rstrip('\n')
+            if key:
+                yield {'Key': key}
@@ -0,0 +1,161 @@
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS run (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    bucket TEXT NOT NULL,
+    prefix TEXT NOT NULL,
+    start_after TEXT,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS failures (
+    key TEXT PRIMARY KEY,
+    size INTEGER,
+    etag TEXT,
+    error TEXT,
+    failed_at TEXT NOT NULL
+);
+"""
+
+
+class ProgressJournal:
+    """
+    Local SQLite journal that lets an interrupted s3_to_glacier run resume.
+
+    Objects coming from the bucket listing are tagged with the number of the
+    page they were listed in. A page is checkpointed once it was fully listed
+    and every object queued from it has been processed; pages complete out
+    of order, so the checkpoint only moves past a page when all the pages
+    before it are complete too. The checkpoint is the last key of that page,
+    which is used as StartAfter on resume. Keys that failed are kept until a
+    later run transitions them.
+    """
+
+    def __init__(self, path: str, bucket_name: str, prefix: Optional[str]):
+        self.bucket_name = bucket_name
+        self.prefix = prefix or ''
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.executescript(SCHEMA)
+
+        # page number -> [objects still being processed, last key or None while listing]
+        self._pages: Dict[int, list] = {}
+        self._next_page = 0
+
+    def _run(self) -> Optional[tuple]:
+        return self._connection.execute(
+            'SELECT bucket, prefix, start_after FROM run WHERE id = 1'
+        ).fetchone()
+
+    def start(self, resume: bool) -> Optional[str]:
+        """
+        Starts a run and returns the key to resume listing after, if any.
+        A fresh run clears the checkpoint and failures of the previous one.
+        """
+        with self._lock:
+            run = self._run()
+            if resume and run:
+                bucket, prefix, start_after = run
+                if (bucket, prefix) != (self.bucket_name, self.prefix):
+                    raise ValueError(
+                        f"Journal belongs to s3://{bucket}/{prefix}, "
+                        f"not s3://{self.bucket_name}/{self.prefix}"
+                    )
+                return start_after
+
+            self._connection.execute('DELETE FROM failures')
+            self._connection.execute(
+                'INSERT OR REPLACE INTO run (id, bucket, prefix, start_after, updated_at) '
+                'VALUES (1, ?, ?, NULL, ?)',
+                (self.bucket_name, self.prefix, datetime.now().isoformat())
+            )
+            self._connection.commit()
+            return None
+
+    def failed_objects(self) -> List[Dict]:
+        """
+        Returns the objects that failed in previous runs as listing entries.
+        """
+        with self._lock:
+            rows = self._connection.execute('SELECT key, size, etag FROM failures').fetchall()
+
+        objects = []
+        for key, size, etag in rows:
+            obj = {'Key': key, 'Size': size or 0}
+            if etag:
+                obj['ETag'] = etag
+            objects.append(obj)
+        return objects
+
+    def page_started(self) -> int:
+        """
+        Registers a new listing page and returns its number.
+        """
+        with self._lock:
+            page_number = self._next_page
+            self._next_page += 1
+            self._pages[page_number] = [0, None]
+            return page_number
+
+    def object_queued(self, obj: Dict) -> None:
+        page_number = obj.get('_page')
+        if page_number is None:
+            return
+        with self._lock:
+            self._pages[page_number][0] += 1
+
+    def page_listed(self, page_number: int, last_key: str) -> None:
+        """
+        Marks a page as fully listed: every object it will queue is queued.
+        """
+        with self._lock:
+            self._pages[page_number][1] = last_key
+            self._advance_checkpoint()
+
+    def object_done(self, obj: Dict, error: Optional[Exception] = None) -> None:
+        """
+        Records the outcome of an object and moves the checkpoint if its
+        page is now complete.
+        """
+        with self._lock:
+            if error is not None:
+                self._connection.execute(
+                    'INSERT OR REPLACE INTO failures (key, size, etag, error, failed_at) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (obj['Key'], obj.get('Size'), obj.get('ETag'), str(error),
+                     datetime.now().isoformat())
+                )
+            elif obj.get('_retry'):
+                self._connection.execute('DELETE FROM failures WHERE key = ?', (obj['Key'],))
+
+            page_number = obj.get('_page')
+            if page_number is not None:
+                self._pages[page_number][0] -= 1
+                self._advance_checkpoint()
+            self._connection.commit()
+
+    def _advance_checkpoint(self) -> None:
+        # Called with the lock held
+        checkpoint = None
+        for page_number in sorted(self._pages):
+            pending, last_key = self._pages[page_number]
+            if pending or last_key is None:
+                break
+            checkpoint = last_key
+            del self._pages[page_number]
+
+        if checkpoint is not None:
+            self._connection.execute(
+                'UPDATE run SET start_after = ?, updated_at = ? WHERE id = 1',
+                (checkpoint, datetime.now().isoformat())
+            )
+            self._connection.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.commit()
+            self._connection.close()
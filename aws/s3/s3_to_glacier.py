@@ -1,110 +1,862 @@
 import boto3
+from botocore.config import Config
 from datetime import datetime, timezone
-from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import chain
+from typing import Callable, Dict, Iterator, List, Optional
 import argparse
+import json
+import queue
+import threading
+import time
+from urllib.parse import urlencode
+
+from s3_inventory import InventoryManifest, iter_key_file_objects
+from s3_journal import ProgressJournal
+
+DEFAULT_WORKERS = 32
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_LIST_WORKERS = 8
+SHARD_DELIMITER = '/'
+PROGRESS_INTERVAL_SECONDS = 30
+
+MiB = 1024 * 1024
+GiB = 1024 * MiB
+# copy_object rejects sources above 5 GiB; multipart copy has part limits
+MAX_SINGLE_COPY_SIZE = 5 * GiB
+MIN_PART_SIZE = 5 * MiB
+MAX_PART_SIZE = 5 * GiB
+MAX_PARTS = 10000
+DEFAULT_MULTIPART_THRESHOLD = 1 * GiB
+DEFAULT_PART_SIZE = 256 * MiB
+DEFAULT_PART_CONCURRENCY = 8
+
+# Dry-run planner histogram settings and throughput assumptions
+AGE_BUCKETS_DAYS = [30, 90, 180, 365, 730]
+MAX_PLAN_PREFIXES = 1000
+ASSUMED_REQUEST_LATENCY_SECONDS = 0.1
+ASSUMED_COPY_BANDWIDTH = 100 * MiB
+
+# Sentinel used to tell workers that the producer has finished
+_STOP = object()
+
+
+class TransitionStats:
+    """
+    Thread-safe counters shared by the producer and the copy workers.
+    """
+
+    def __init__(self):
+        self.modified = 0
+        self.skipped = 0
+        self.errors = 0
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def increment(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def throughput(self) -> float:
+        elapsed = time.monotonic() - self.started_at
+        return self.modified / elapsed if elapsed > 0 else 0.0
+
+
+class RequestCounter:
+    """
+    Counts the calls a client makes to one S3 operation, through the botocore
+    event hooks, so the planner reports the listing requests actually made
+    (delimiter levels and pages of every shard) instead of estimating them.
+    """
+
+    def __init__(self, s3_client, operation: str):
+        self._calls = 0
+        self._lock = threading.Lock()
+        s3_client.meta.events.register(f'before-call.s3.{operation}', self._increment)
+
+    def _increment(self, **kwargs) -> None:
+        with self._lock:
+            self._calls += 1
+
+    def count(self) -> int:
+        return self._calls
+
+
+def create_s3_client(
+    workers: int = DEFAULT_WORKERS,
+    part_concurrency: int = DEFAULT_PART_CONCURRENCY,
+    list_workers: int = 1
+):
+    """
+    Creates an S3 client that can be shared by all workers.
+
+    The connection pool is sized for the peak number of requests in flight:
+    every worker may be running a multipart copy with part_concurrency part
+    copies at once (a worker waits on its parts, so its own connection is
+    free meanwhile), plus the listing threads. Adaptive retries slow the
+    client down when S3 starts throttling (503 SlowDown).
+    """
+    client_config = Config(
+        max_pool_connections=max(workers * max(part_concurrency, 1) + list_workers, 10),
+        retries={'max_attempts': 10, 'mode': 'adaptive'}
+    )
+    return boto3.client('s3', config=client_config)
+
+
+def iter_listed_objects(
+    s3_client,
+    bucket_name: str,
+    prefix: Optional[str],
+    start_after: Optional[str] = None,
+    journal: Optional[ProgressJournal] = None
+) -> Iterator[Dict]:
+    """
+    Lists the bucket page by page with list_objects_v2.
+
+    When a journal is given, objects are tagged with their page number and
+    the journal is told when each page has been fully handed out.
+    """
+    # Prepare listing parameters
+    list_params = {
+        'Bucket': bucket_name
+    }
+    if prefix:
+        list_params['Prefix'] = prefix
+    if start_after:
+        list_params['StartAfter'] = start_after
+
+    # List all objects in the bucket (handles pagination automatically)
+    paginator = s3_client.get_paginator('list_objects_v2')
+
+    for page in paginator.paginate(**list_params):
+        if 'Contents' not in page:
+            continue
+
+        if not journal:
+            yield from page['Contents']
+            continue
+
+        page_number = journal.page_started()
+        for obj in page['Contents']:
+            obj['_page'] = page_number
+            yield obj
+        journal.page_listed(page_number, page['Contents'][-1]['Key'])
+
+
+def _put_until_stopped(out: queue.Queue, item, stop: threading.Event) -> bool:
+    # Blocks like Queue.put but gives up once the consumer went away
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def iter_sharded_objects(
+    s3_client,
+    bucket_name: str,
+    prefix: Optional[str],
+    shard_depth: int,
+    list_workers: int = DEFAULT_LIST_WORKERS,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    verbose: bool = True
+) -> Iterator[Dict]:
+    """
+    Lists the bucket with several list_objects_v2 paginators at once.
+
+    The common prefixes below prefix are discovered with a delimiter listing,
+    shard_depth levels deep. Each shard found is then listed concurrently and
+    all objects are merged into a single stream (in no particular order).
+    Objects that sit directly on a discovered level are yielded as well.
+    """
+    out = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    paginator = s3_client.get_paginator('list_objects_v2')
+
+    def list_prefix(shard_prefix: str, delimiter: Optional[str] = None) -> List[str]:
+        list_params = {'Bucket': bucket_name, 'Prefix': shard_prefix}
+        if delimiter:
+            list_params['Delimiter'] = delimiter
+
+        common_prefixes = []
+        for page in paginator.paginate(**list_params):
+            for obj in page.get('Contents', []):
+                if not _put_until_stopped(out, obj, stop):
+                    return common_prefixes
+            common_prefixes.extend(p['Prefix'] for p in page.get('CommonPrefixes', []))
+        return common_prefixes
+
+    def produce() -> None:
+        try:
+            with ThreadPoolExecutor(max_workers=list_workers) as executor:
+                shards = [prefix or '']
+                for _ in range(shard_depth):
+                    levels = executor.map(lambda p: list_prefix(p, SHARD_DELIMITER), shards)
+                    shards = [common_prefix for level in levels for common_prefix in level]
+
+                if verbose:
+                    print(f"Listing {len(shards)} shards with {list_workers} workers")
+                # Consume the results so listing errors are raised here
+                list(executor.map(list_prefix, shards))
+            _put_until_stopped(out, _STOP, stop)
+        except Exception as e:
+            _put_until_stopped(out, e, stop)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = out.get()
+            if item is _STOP:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        producer.join()
+
+
+def skip_reason(
+    obj: Dict,
+    older_than_days: Optional[int],
+    current_time: datetime
+) -> Optional[str]:
+    """
+    Returns why an object must not be moved to Glacier, or None if it must.
+    """
+    # Skip if already in Glacier
+    if obj.get('StorageClass', 'STANDARD') == 'GLACIER':
+        return 'already_glacier'
+
+    # Check age if specified
+    if older_than_days and (current_time - obj['LastModified']).days < older_than_days:
+        return 'too_recent'
+
+    return None
+
+
+def filter_candidate_objects(
+    objects: Iterator[Dict],
+    prefix: Optional[str],
+    older_than_days: Optional[int],
+    stats: TransitionStats
+) -> Iterator[Dict]:
+    """
+    Yields only the objects that must be moved to Glacier. Skipped objects
+    are counted in stats.
+    """
+    # Get current time for age comparison
+    current_time = datetime.now(timezone.utc)
+
+    for obj in objects:
+        key = obj['Key']
+        if prefix and not key.startswith(prefix):
+            continue
+
+        reason = skip_reason(obj, older_than_days, current_time)
+        if reason == 'already_glacier':
+            print(f"⏭️  Skipping {key} - Already in Glacier")
+            stats.increment('skipped')
+            continue
+        if reason == 'too_recent':
+            age_days = (current_time - obj['LastModified']).days
+            print(f"⏭️  Skipping {key} - Too recent ({age_days} days old)")
+            stats.increment('skipped')
+            continue
+
+        yield obj
+
+
+def transition_object(
+    s3_client,
+    bucket_name: str,
+    obj: Dict,
+    multipart_threshold: int = DEFAULT_MULTIPART_THRESHOLD,
+    part_size: int = DEFAULT_PART_SIZE,
+    part_concurrency: int = DEFAULT_PART_CONCURRENCY
+) -> Optional[str]:
+    """
+    Changes the storage class of a single object to Glacier. Returns a skip
+    reason instead when the object turns out to be in Glacier already.
+
+    The object size comes from the listing entry, so choosing between the
+    single request copy and the multipart copy does not need a HEAD call.
+    Entries without a size or storage class (a key file, or an inventory
+    without those fields) are completed with a HEAD call first.
+    """
+    key = obj['Key']
+    if 'Size' not in obj or 'StorageClass' not in obj:
+        head = s3_client.head_object(Bucket=bucket_name, Key=key)
+        obj['Size'] = head['ContentLength']
+        # HEAD omits the storage class for STANDARD objects
+        obj['StorageClass'] = head.get('StorageClass', 'STANDARD')
+        obj.setdefault('ETag', head['ETag'])
+        if obj['StorageClass'] == 'GLACIER':
+            return 'already_glacier'
+
+    size = obj['Size']
+    if size > min(multipart_threshold, MAX_SINGLE_COPY_SIZE):
+        multipart_copy_object(s3_client, bucket_name, obj, part_size, part_concurrency)
+        return None
+
+    s3_client.copy_object(
+        Bucket=bucket_name,
+        CopySource={'Bucket': bucket_name, 'Key': key},
+        Key=key,
+        StorageClass='GLACIER',
+        MetadataDirective='COPY'
+    )
+    return None
+
+
+def compute_part_size(size: int, part_size: int) -> int:
+    """
+    Returns a part size within the S3 limits that splits size into at most
+    MAX_PARTS parts.
+    """
+    part_size = max(part_size, MIN_PART_SIZE)
+    if size > part_size * MAX_PARTS:
+        # Grow the parts (rounded up to a whole MiB) to stay under MAX_PARTS
+        part_size = -(-size // MAX_PARTS)
+        part_size = -(-part_size // MiB) * MiB
+    return min(part_size, MAX_PART_SIZE)
+
+
+def multipart_copy_object(
+    s3_client,
+    bucket_name: str,
+    obj: Dict,
+    part_size: int = DEFAULT_PART_SIZE,
+    part_concurrency: int = DEFAULT_PART_CONCURRENCY
+) -> None:
+    """
+    Copies a large object onto itself as Glacier using parallel
+    upload_part_copy requests.
+
+    A multipart upload does not carry over the source metadata and tags the
+    way copy_object does, so they are read once and set on the new upload.
+    """
+    key = obj['Key']
+    size = obj['Size']
+    part_size = compute_part_size(size, part_size)
+    copy_source = {'Bucket': bucket_name, 'Key': key}
+
+    head = s3_client.head_object(Bucket=bucket_name, Key=key)
+    upload_params = {
+        'Bucket': bucket_name,
+        'Key': key,
+        'StorageClass': 'GLACIER',
+        'Metadata': head.get('Metadata', {})
+    }
+    for header in ('ContentType', 'ContentEncoding', 'ContentDisposition',
+                   'ContentLanguage', 'CacheControl'):
+        if head.get(header):
+            upload_params[header] = head[header]
+
+    tag_set = s3_client.get_object_tagging(Bucket=bucket_name, Key=key).get('TagSet', [])
+    if tag_set:
+        upload_params['Tagging'] = urlencode([(tag['Key'], tag['Value']) for tag in tag_set])
+
+    upload_id = s3_client.create_multipart_upload(**upload_params)['UploadId']
+
+    def copy_part(part_number: int) -> Dict:
+        start = (part_number - 1) * part_size
+        end = min(start + part_size, size) - 1
+        part_params = {
+            'Bucket': bucket_name,
+            'Key': key,
+            'UploadId': upload_id,
+            'PartNumber': part_number,
+            'CopySource': copy_source,
+            'CopySourceRange': f'bytes={start}-{end}'
+        }
+        # Fail instead of mixing parts if the object changes mid-copy
+        if obj.get('ETag'):
+            part_params['CopySourceIfMatch'] = obj['ETag']
+        response = s3_client.upload_part_copy(**part_params)
+        return {'PartNumber': part_number, 'ETag': response['CopyPartResult']['ETag']}
+
+    part_count = -(-size // part_size)
+    try:
+        with ThreadPoolExecutor(max_workers=part_concurrency) as executor:
+            parts = list(executor.map(copy_part, range(1, part_count + 1)))
+
+        s3_client.complete_multipart_upload(
+            Bucket=bucket_name,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': parts}
+        )
+    except Exception:
+        s3_client.abort_multipart_upload(Bucket=bucket_name, Key=key, UploadId=upload_id)
+        raise
+
+
+def open_object_source(
+    s3_client,
+    bucket_name: str,
+    prefix: Optional[str],
+    older_than_days: Optional[int],
+    inventory_manifest: Optional[str] = None,
+    keys_file: Optional[str] = None,
+    shard_depth: int = 0,
+    list_workers: int = DEFAULT_LIST_WORKERS,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    start_after: Optional[str] = None,
+    journal: Optional[ProgressJournal] = None,
+    verbose: bool = True
+) -> Iterator[Dict]:
+    """
+    Returns the stream of listing entries to process: an S3 Inventory, a key
+    file, a sharded listing or the plain bucket listing.
+    """
+    if inventory_manifest:
+        manifest = InventoryManifest(inventory_manifest, s3_client)
+        if manifest.source_bucket and manifest.source_bucket != bucket_name:
+            raise ValueError(
+                f"Inventory is for bucket {manifest.source_bucket}, not {bucket_name}"
+            )
+        if older_than_days and not manifest.has_last_modified:
+            raise ValueError("--older-than needs LastModified, which this inventory does not have "
+                             "(enable the LastModifiedDate field)")
+        if verbose:
+            print(f"Reading {manifest.file_format} inventory: {inventory_manifest} "
+                  f"({len(manifest.data_files)} files)")
+        return manifest.iter_objects()
+    if keys_file:
+        if older_than_days:
+            raise ValueError("--older-than needs LastModified, which a key file does not have")
+        if verbose:
+            print(f"Reading keys from: {keys_file}")
+        return iter_key_file_objects(keys_file)
+    if shard_depth > 0:
+        return iter_sharded_objects(
+            s3_client, bucket_name, prefix, shard_depth, list_workers, queue_size, verbose
+        )
+    return iter_listed_objects(s3_client, bucket_name, prefix, start_after, journal)
+
+
+def _transition_worker(
+    transition: Callable[[Dict], Optional[str]],
+    work_queue: queue.Queue,
+    stats: TransitionStats,
+    journal: Optional[ProgressJournal] = None
+) -> None:
+    while True:
+        obj = work_queue.get()
+        try:
+            if obj is _STOP:
+                return
+
+            key = obj['Key']
+            error = None
+            try:
+                if transition(obj) == 'already_glacier':
+                    print(f"⏭️  Skipping {key} - Already in Glacier")
+                    stats.increment('skipped')
+                else:
+                    print(f"✅ Changed to Glacier: {key}")
+                    stats.increment('modified')
+            except Exception as e:
+                print(f"❌ Error processing {key}: {str(e)}")
+                stats.increment('errors')
+                error = e
+
+            if journal:
+                journal.object_done(obj, error)
+        finally:
+            work_queue.task_done()
+
+
+def run_transitions(
+    transition: Callable[[Dict], Optional[str]],
+    objects: Iterator[Dict],
+    stats: TransitionStats,
+    workers: int = DEFAULT_WORKERS,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    journal: Optional[ProgressJournal] = None
+) -> None:
+    """
+    Feeds objects into a bounded queue consumed by a pool of copy workers.
+
+    The producer blocks when the queue is full, so the listing never runs
+    more than queue_size objects ahead of the copies and memory stays flat.
+    """
+    work_queue = queue.Queue(maxsize=queue_size)
+    threads: List[threading.Thread] = []
+    for _ in range(workers):
+        thread = threading.Thread(
+            target=_transition_worker,
+            args=(transition, work_queue, stats, journal),
+            daemon=True
+        )
+        thread.start()
+        threads.append(thread)
+
+    last_report = time.monotonic()
+    try:
+        for obj in objects:
+            if journal:
+                journal.object_queued(obj)
+            work_queue.put(obj)
+
+            if time.monotonic() - last_report >= PROGRESS_INTERVAL_SECONDS:
+                print(f"📈 Progress: {stats.modified} modified, "
+                      f"{stats.throughput():.1f} objects/sec")
+                last_report = time.monotonic()
+    finally:
+        for _ in threads:
+            work_queue.put(_STOP)
+        for thread in threads:
+            thread.join()
+
+
+def _age_bucket(obj: Dict, current_time: datetime) -> str:
+    if 'LastModified' not in obj:
+        return 'unknown'
+    age_days = (current_time - obj['LastModified']).days
+    lower = 0
+    for upper in AGE_BUCKETS_DAYS:
+        if age_days < upper:
+            return f'{lower}-{upper}d'
+        lower = upper
+    return f'{lower}d+'
+
+
+def _prefix_bucket(key: str, prefix: Optional[str]) -> str:
+    # Groups keys by the first '/' level below the requested prefix
+    rest = key[len(prefix or ''):]
+    if '/' not in rest:
+        return prefix or ''
+    return (prefix or '') + rest.split('/', 1)[0] + '/'
+
+
+def _add_to_histogram(histogram: Dict, name: str, size: int, max_entries: Optional[int] = None) -> None:
+    if name not in histogram and max_entries and len(histogram) >= max_entries:
+        name = '(other)'
+    entry = histogram.setdefault(name, {'objects': 0, 'bytes': 0})
+    entry['objects'] += 1
+    entry['bytes'] += size
+
+
+def plan_transitions(
+    objects: Iterator[Dict],
+    prefix: Optional[str],
+    older_than_days: Optional[int],
+    workers: int = DEFAULT_WORKERS,
+    multipart_threshold: int = DEFAULT_MULTIPART_THRESHOLD,
+    part_size: int = DEFAULT_PART_SIZE,
+    part_concurrency: int = DEFAULT_PART_CONCURRENCY,
+    list_requests: Optional[Callable[[], int]] = None
+) -> Dict:
+    """
+    Streams the objects once and returns what a real run would do: counts
+    and bytes per prefix, age bucket and current storage class, the number
+    of requests by API call and an estimated duration at the given
+    concurrency. Only aggregates are kept, never the keys.
+
+    list_requests returns the number of list_objects_v2 calls made by the
+    source once it is exhausted (None when the source is not a listing).
+    """
+    current_time = datetime.now(timezone.utc)
+    scanned = {'objects': 0, 'bytes': 0}
+    skipped: Dict[str, Dict] = {}
+    by_prefix: Dict[str, Dict] = {}
+    by_age: Dict[str, Dict] = {}
+    by_storage_class: Dict[str, Dict] = {}
+    single = {'objects': 0, 'bytes': 0}
+    multipart = {'objects': 0, 'bytes': 0, 'parts': 0}
+    # Entries without size or storage class get a HEAD in transition_object
+    incomplete = 0
+
+    for obj in objects:
+        key = obj['Key']
+        if prefix and not key.startswith(prefix):
+            continue
+
+        size = obj.get('Size', 0)
+        scanned['objects'] += 1
+        scanned['bytes'] += size
+
+        reason = skip_reason(obj, older_than_days, current_time)
+        if reason:
+            _add_to_histogram(skipped, reason, size)
+            continue
+
+        _add_to_histogram(by_prefix, _prefix_bucket(key, prefix), size, MAX_PLAN_PREFIXES)
+        _add_to_histogram(by_age, _age_bucket(obj, current_time), size)
+        _add_to_histogram(by_storage_class, obj.get('StorageClass', 'STANDARD'), size)
+        if 'Size' not in obj or 'StorageClass' not in obj:
+            incomplete += 1
+
+        if size > min(multipart_threshold, MAX_SINGLE_COPY_SIZE):
+            multipart['objects'] += 1
+            multipart['bytes'] += size
+            multipart['parts'] += -(-size // compute_part_size(size, part_size))
+        else:
+            single['objects'] += 1
+            single['bytes'] += size
+
+    requests = {
+        'list_objects_v2': list_requests() if list_requests else 0,
+        'copy_object': single['objects'],
+        'head_object': incomplete + multipart['objects'],
+        'get_object_tagging': multipart['objects'],
+        'create_multipart_upload': multipart['objects'],
+        'upload_part_copy': multipart['parts'],
+        'complete_multipart_upload': multipart['objects']
+    }
+    requests['total'] = sum(requests.values())
+
+    # Each copy request pays a fixed latency plus the time to copy its bytes
+    single_seconds = (single['objects'] * ASSUMED_REQUEST_LATENCY_SECONDS
+                      + single['bytes'] / ASSUMED_COPY_BANDWIDTH) / workers
+    multipart_streams = max(min(workers, multipart['objects']) * part_concurrency, 1)
+    multipart_seconds = (multipart['parts'] * ASSUMED_REQUEST_LATENCY_SECONDS
+                         + multipart['bytes'] / ASSUMED_COPY_BANDWIDTH) / multipart_streams
+
+    to_transition = single['objects'] + multipart['objects']
+    return {
+        'scanned': scanned,
+        'skipped': skipped,
+        'to_transition': {
+            'objects': to_transition,
+            'bytes': single['bytes'] + multipart['bytes'],
+            'single_copy_objects': single['objects'],
+            'multipart_objects': multipart['objects'],
+            'multipart_parts': multipart['parts']
+        },
+        'by_prefix': by_prefix,
+        'by_age': by_age,
+        'by_storage_class': by_storage_class,
+        'requests': requests,
+        'estimate': {
+            'workers': workers,
+            'part_concurrency': part_concurrency,
+            'seconds': round(single_seconds + multipart_seconds, 1),
+            'objects_per_second': round(to_transition / (single_seconds + multipart_seconds), 1)
+            if to_transition else 0.0,
+            'assumed_request_latency_seconds': ASSUMED_REQUEST_LATENCY_SECONDS,
+            'assumed_copy_bandwidth_bytes_per_second': ASSUMED_COPY_BANDWIDTH
+        }
+    }
+
+
+def plan_storage_to_glacier(
+    bucket_name: str,
+    prefix: Optional[str] = None,
+    older_than_days: Optional[int] = None,
+    workers: int = DEFAULT_WORKERS,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    multipart_threshold: int = DEFAULT_MULTIPART_THRESHOLD,
+    part_size: int = DEFAULT_PART_SIZE,
+    part_concurrency: int = DEFAULT_PART_CONCURRENCY,
+    inventory_manifest: Optional[str] = None,
+    keys_file: Optional[str] = None,
+    shard_depth: int = 0,
+    list_workers: int = DEFAULT_LIST_WORKERS
+) -> None:
+    """
+    Dry run of change_storage_to_glacier: prints a JSON summary of what
+    would be moved and how long it would take, without copying anything.
+    """
+    s3_client = create_s3_client(workers, part_concurrency, list_workers if shard_depth else 1)
+    list_calls = RequestCounter(s3_client, 'ListObjectsV2')
+    source = open_object_source(
+        s3_client, bucket_name, prefix, older_than_days, inventory_manifest, keys_file,
+        shard_depth, list_workers, queue_size, verbose=False
+    )
+    plan = plan_transitions(
+        source, prefix, older_than_days, workers, multipart_threshold, part_size,
+        part_concurrency, None if inventory_manifest or keys_file else list_calls.count
+    )
+    plan = {
+        'bucket': bucket_name,
+        'prefix': prefix,
+        'older_than_days': older_than_days,
+        **plan
+    }
+    print(json.dumps(plan, indent=2))
+
 
 def change_storage_to_glacier(
     bucket_name: str,
     prefix: Optional[str] = None,
-    older_than_days: Optional[int] = None
+    older_than_days: Optional[int] = None,
+    workers: int = DEFAULT_WORKERS,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    multipart_threshold: int = DEFAULT_MULTIPART_THRESHOLD,
+    part_size: int = DEFAULT_PART_SIZE,
+    part_concurrency: int = DEFAULT_PART_CONCURRENCY,
+    inventory_manifest: Optional[str] = None,
+    keys_file: Optional[str] = None,
+    shard_depth: int = 0,
+    list_workers: int = DEFAULT_LIST_WORKERS,
+    journal_path: Optional[str] = None,
+    resume: bool = False
 ) -> None:
     """
     Changes objects in an S3 bucket to Glacier storage class.
-    
+
     Args:
         bucket_name: Name of the S3 bucket
         prefix: Optional prefix to filter objects (folder path)
         older_than_days: Optional, only change objects older than specified days
+        workers: Number of concurrent copy workers
+        queue_size: Maximum number of listed objects waiting for a worker
+        multipart_threshold: Objects larger than this (bytes) use multipart copy
+        part_size: Part size (bytes) for multipart copies
+        part_concurrency: Parallel part copies per multipart object
+        inventory_manifest: Optional S3 Inventory manifest.json (local path or
+            s3:// URI) read instead of listing the bucket
+        keys_file: Optional local file with one key per line read instead of
+            listing the bucket
+        shard_depth: When above zero, discover prefixes this many delimiter
+            levels below prefix and list them concurrently
+        list_workers: Number of concurrent listings when sharding
+        journal_path: Optional SQLite file recording progress and failed keys
+        resume: Continue the run recorded in journal_path: retry its failed
+            keys and list only after its checkpoint
     """
+    journal = None
     try:
-        # Create S3 client
-        s3_client = boto3.client('s3')
-        
-        # Prepare listing parameters
-        list_params = {
-            'Bucket': bucket_name
-        }
-        if prefix:
-            list_params['Prefix'] = prefix
-            
-        # Get current time for age comparison
-        current_time = datetime.now(timezone.utc)
-        
-        # Counter for modified objects
-        modified_count = 0
-        skipped_count = 0
-        error_count = 0
-        
-        # List all objects in the bucket (handles pagination automatically)
-        paginator = s3_client.get_paginator('list_objects_v2')
-        
+        # Create S3 client shared by all workers
+        s3_client = create_s3_client(workers, part_concurrency, list_workers if shard_depth else 1)
+        stats = TransitionStats()
+
         print(f"Scanning bucket: {bucket_name}")
         print(f"Prefix filter: {prefix if prefix else 'None'}")
         print(f"Age filter: {older_than_days if older_than_days else 'None'} days")
-        
-        for page in paginator.paginate(**list_params):
-            if 'Contents' not in page:
-                continue
-                
-            for obj in page['Contents']:
-                try:
-                    key = obj['Key']
-                    current_storage_class = obj.get('StorageClass', 'STANDARD')
-                    
-                    # Skip if already in Glacier
-                    if current_storage_class == 'GLACIER':
-                        print(f"⏭️  Skipping {key} - Already in Glacier")
-                        skipped_count += 1
-                        continue
-                    
-                    # Check age if specified
-                    if older_than_days:
-                        age_days = (current_time - obj['LastModified']).days
-                        if age_days < older_than_days:
-                            print(f"⏭️  Skipping {key} - Too recent ({age_days} days old)")
-                            skipped_count += 1
-                            continue
-                    
-                    # Change storage class to Glacier
-                    s3_client.copy_object(
-                        Bucket=bucket_name,
-                        CopySource={'Bucket': bucket_name, 'Key': key},
-                        Key=key,
-                        StorageClass='GLACIER',
-                        MetadataDirective='COPY'
-                    )
-                    
-                    print(f"✅ Changed to Glacier: {key}")
-                    modified_count += 1
-                    
-                except Exception as e:
-                    print(f"❌ Error processing {key}: {str(e)}")
-                    error_count += 1
-        
+        print(f"Workers: {workers}")
+
+        start_after = None
+        retry_objects: List[Dict] = []
+        if journal_path:
+            journal = ProgressJournal(journal_path, bucket_name, prefix)
+            start_after = journal.start(resume)
+            if resume:
+                retry_objects = journal.failed_objects()
+                for obj in retry_objects:
+                    obj['_retry'] = True
+                print(f"Resuming from journal {journal_path}: retrying {len(retry_objects)} failed keys, "
+                      f"listing after {start_after if start_after else 'the beginning'}")
+
+        source = open_object_source(
+            s3_client, bucket_name, prefix, older_than_days, inventory_manifest, keys_file,
+            shard_depth, list_workers, queue_size, start_after, journal
+        )
+
+        if retry_objects:
+            # Failed keys after the checkpoint would otherwise be listed again
+            retry_keys = {obj['Key'] for obj in retry_objects}
+            source = (obj for obj in source if obj['Key'] not in retry_keys)
+
+        objects = chain(
+            retry_objects,
+            filter_candidate_objects(source, prefix, older_than_days, stats)
+        )
+        transition = partial(
+            transition_object,
+            s3_client,
+            bucket_name,
+            multipart_threshold=multipart_threshold,
+            part_size=part_size,
+            part_concurrency=part_concurrency
+        )
+        run_transitions(transition, objects, stats, workers, queue_size, journal)
+
         # Print summary
+        elapsed = time.monotonic() - stats.started_at
         print("\nSummary:")
-        print(f"Modified: {modified_count} objects")
-        print(f"Skipped: {skipped_count} objects")
-        print(f"Errors: {error_count} objects")
-        
+        print(f"Modified: {stats.modified} objects")
+        print(f"Skipped: {stats.skipped} objects")
+        print(f"Errors: {stats.errors} objects")
+        print(f"Elapsed: {elapsed:.1f}s ({stats.throughput():.1f} objects/sec)")
+        if journal and stats.errors:
+            print(f"Failed keys recorded in {journal_path}, run again with --resume to retry them")
+
     except Exception as e:
         print(f"Error: {str(e)}")
+    finally:
+        if journal:
+            journal.close()
 
 def main():
     parser = argparse.ArgumentParser(description='Change S3 objects to Glacier storage class')
     parser.add_argument('bucket', help='Name of the S3 bucket')
     parser.add_argument('--prefix', help='Optional prefix filter (folder path)')
     parser.add_argument('--older-than', type=int, help='Only change objects older than specified days')
-    
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Number of concurrent copy workers (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help=f'Maximum listed objects waiting to be copied (default: {DEFAULT_QUEUE_SIZE})')
+    parser.add_argument('--multipart-threshold-mb', type=int, default=DEFAULT_MULTIPART_THRESHOLD // MiB,
+                        help='Objects larger than this use a parallel multipart copy '
+                             f'(default: {DEFAULT_MULTIPART_THRESHOLD // MiB})')
+    parser.add_argument('--part-size-mb', type=int, default=DEFAULT_PART_SIZE // MiB,
+                        help=f'Part size for multipart copies (default: {DEFAULT_PART_SIZE // MiB})')
+    parser.add_argument('--part-concurrency', type=int, default=DEFAULT_PART_CONCURRENCY,
+                        help=f'Parallel part copies per large object (default: {DEFAULT_PART_CONCURRENCY})')
+    parser.add_argument('--shard-depth', type=int, default=0,
+                        help="List prefixes this many '/' levels below --prefix concurrently (default: 0, disabled)")
+    parser.add_argument('--list-workers', type=int, default=DEFAULT_LIST_WORKERS,
+                        help=f'Concurrent listings when --shard-depth is set (default: {DEFAULT_LIST_WORKERS})')
+    source_group = parser.add_mutually_exclusive_group()
+    source_group.add_argument('--inventory-manifest',
+                              help='S3 Inventory manifest.json (path or s3:// URI) to read instead of listing')
+    source_group.add_argument('--keys-file', help='Local file with one key per line to read instead of listing '
+                                   '(sizes and storage classes are read with a HEAD per key)')
+    parser.add_argument('--journal',
+                        help='SQLite file recording progress and failed keys so the run can be resumed')
+    parser.add_argument('--resume', action='store_true',
+                        help='Retry the failed keys in --journal and continue listing after its checkpoint '
+                             '(the checkpoint only applies to the plain bucket listing)')
+    parser.add_argument('--plan', action='store_true',
+                        help='Do not copy anything, print a JSON summary of what would be moved')
+
     args = parser.parse_args()
-    
+    if args.resume and not args.journal:
+        parser.error('--resume requires --journal')
+
+    if args.plan:
+        plan_storage_to_glacier(
+            bucket_name=args.bucket,
+            prefix=args.prefix,
+            older_than_days=args.older_than,
+            workers=args.workers,
+            queue_size=args.queue_size,
+            multipart_threshold=args.multipart_threshold_mb * MiB,
+            part_size=args.part_size_mb * MiB,
+            part_concurrency=args.part_concurrency,
+            inventory_manifest=args.inventory_manifest,
+            keys_file=args.keys_file,
+            shard_depth=args.shard_depth,
+            list_workers=args.list_workers
+        )
+        return
+
     print("Starting S3 to Glacier migration...")
     change_storage_to_glacier(
         bucket_name=args.bucket,
         prefix=args.prefix,
-        older_than_days=args.older_than
+        older_than_days=args.older_than,
+        workers=args.workers,
+        queue_size=args.queue_size,
+        multipart_threshold=args.multipart_threshold_mb * MiB,
+        part_size=args.part_size_mb * MiB,
+        part_concurrency=args.part_concurrency,
+        inventory_manifest=args.inventory_manifest,
+        keys_file=args.keys_file,
+        shard_depth=args.shard_depth,
+        list_workers=args.list_workers,
+        journal_path=args.journal,
+        resume=args.resume
     )
     print("\nFinished!")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,170 @@
+import json
+import sqlite3
+import threading
+import time
+
+from requests.models import PreparedRequest
+
+# Validade padrão das entradas do cache (segundos)
+DEFAULT_MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+# Tamanho máximo padrão dos dados guardados no cache (bytes)
+DEFAULT_MAX_SIZE_BYTES = 200 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    links TEXT NOT NULL,
+    body TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    validated_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+"""
+
+
+class CachedResponse:
+    """
+    Resposta montada a partir do cache quando a API devolve 304. Tem os
+    mesmos atributos usados pelo script em uma requests.Response.
+    """
+
+    def __init__(self, body, links):
+        self.status_code = 200
+        self.headers = {}
+        self.text = body
+        self.links = links
+        self.from_cache = True
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        pass
+
+
+class ConditionalCacheSession:
+    """
+    Cache em disco (SQLite) de respostas da API do GitHub, usando requisições
+    condicionais.
+
+    Respostas com ETag ou Last-Modified são guardadas por URL (com os
+    parâmetros da consulta). Nas execuções seguintes a requisição é enviada
+    com If-None-Match/If-Modified-Since; um 304 devolve o conteúdo do cache
+    e não conta no limite de requisições do GitHub. Entradas não validadas
+    pela API há mais de max_age são descartadas, e as menos usadas saem
+    quando o cache passa de max_size.
+
+    Envolve outra sessão e expõe o mesmo get().
+    """
+
+    def __init__(self, session, path, max_age=DEFAULT_MAX_AGE_SECONDS, max_size=DEFAULT_MAX_SIZE_BYTES):
+        self.session = session
+        self.max_age = max_age
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(SCHEMA)
+        self._expire()
+
+    @property
+    def headers(self):
+        return self.session.headers
+
+    @property
+    def throttled_count(self):
+        return self.session.throttled_count
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def _expire(self):
+        with self._lock:
+            self._connection.execute(
+                'DELETE FROM responses WHERE validated_at < ?', (time.time() - self.max_age,)
+            )
+            total = self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+            if total > self.max_size:
+                # Remove as entradas acessadas há mais tempo até caber no limite
+                rows = self._connection.execute(
+                    'SELECT url, size FROM responses ORDER BY accessed_at'
+                ).fetchall()
+                for url, size in rows:
+                    if total <= self.max_size:
+                        break
+                    self._connection.execute('DELETE FROM responses WHERE url = ?', (url,))
+                    total -= size
+            self._connection.commit()
+
+    def get(self, url, headers=None, params=None, **kwargs):
+        request = PreparedRequest()
+        request.prepare_url(url, params)
+        cache_key = request.url
+
+        with self._lock:
+            cached = self._connection.execute(
+                'SELECT etag, last_modified, links, body FROM responses WHERE url = ?', (cache_key,)
+            ).fetchone()
+
+        request_headers = dict(headers or {})
+        if cached:
+            etag, last_modified, _, _ = cached
+            if etag:
+                request_headers['If-None-Match'] = etag
+            if last_modified:
+                request_headers['If-Modified-Since'] = last_modified
+
+        response = self.session.get(url, headers=request_headers, params=params, **kwargs)
+
+        if response.status_code == 304 and cached:
+            with self._lock:
+                self.hits += 1
+                self._connection.execute(
+                    'UPDATE responses SET validated_at = ?, accessed_at = ? WHERE url = ?',
+                    (time.time(), time.time(), cache_key)
+                )
+                self._connection.commit()
+            return CachedResponse(cached[3], json.loads(cached[2]))
+
+        if response.status_code == 304:
+            # 304 sem corpo no cache (ex.: If-None-Match vindo do chamador):
+            # repete a requisição sem os cabeçalhos condicionais
+            plain_headers = {
+                name: value for name, value in request_headers.items()
+                if name.lower() not in ('if-none-match', 'if-modified-since')
+            }
+            response = self.session.get(url, headers=plain_headers, params=params, **kwargs)
+
+        with self._lock:
+            self.misses += 1
+
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if response.status_code == 200 and (etag or last_modified):
+            now = time.time()
+            with self._lock:
+                self._connection.execute(
+                    'INSERT OR REPLACE INTO responses '
+                    '(url, etag, last_modified, links, body, size, validated_at, accessed_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (cache_key, etag, last_modified, json.dumps(response.links), response.text,
+                     len(response.content), now, now)
+                )
+                self._connection.commit()
+
+        return response
+
+    def post(self, url, **kwargs):
+        # Requisições POST (GraphQL) não são cacheáveis
+        return self.session.post(url, **kwargs)
+
+    def close(self):
+        self._expire()
+        with self._lock:
+            self._connection.close()
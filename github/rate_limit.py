@@ -0,0 +1,136 @@
+import threading
+import time
+from urllib.parse import urlparse
+
+# Tentativas para requisições limitadas pela API antes de desistir
+MAX_RETRIES = 5
+# Abaixo desse saldo de requisições o ritmo é espaçado até o reset
+LOW_BUDGET = 100
+# Espera máxima em uma única pausa (segundos)
+MAX_WAIT_SECONDS = 15 * 60
+
+
+def is_graphql_rate_limited(response):
+    """
+    A API GraphQL responde ao limite primário com HTTP 200 e um erro
+    RATE_LIMITED no corpo, em vez de 403/429.
+    """
+    # Respostas do cache (CachedResponse) não têm url e nunca são do GraphQL
+    if not urlparse(getattr(response, 'url', None) or '').path.endswith('/graphql'):
+        return False
+    try:
+        errors = response.json().get('errors') or []
+    except ValueError:
+        return False
+    return any(error.get('type') == 'RATE_LIMITED' for error in errors)
+
+
+def is_throttled(response):
+    """
+    Indica se a resposta é um bloqueio por limite de requisições (primário ou
+    secundário), e não uma falta de permissão.
+    """
+    if response.status_code == 429:
+        return True
+    if response.status_code == 200:
+        return is_graphql_rate_limited(response)
+    if response.status_code != 403:
+        return False
+    if 'Retry-After' in response.headers or response.headers.get('X-RateLimit-Remaining') == '0':
+        return True
+    return 'rate limit' in response.text.lower()
+
+
+class RateLimitedSession:
+    """
+    Envolve uma requests.Session e agenda as chamadas à API do GitHub de
+    acordo com os cabeçalhos de limite de requisições.
+
+    - Limita o número de requisições simultâneas.
+    - Acompanha X-RateLimit-Remaining/X-RateLimit-Reset e, quando o saldo
+      fica baixo, espaça as requisições até o reset em vez de esgotá-lo.
+    - Quando uma resposta é bloqueada (429, 403 com Retry-After ou saldo
+      zerado, ou erro RATE_LIMITED do GraphQL), pausa todas as threads e
+      tenta de novo com backoff ou até o reset da janela.
+
+    Expõe os mesmos get()/post() da sessão, então pode ser usada no lugar dela.
+    """
+
+    def __init__(self, session, max_concurrency, max_retries=MAX_RETRIES):
+        self.session = session
+        self.max_retries = max_retries
+        self.throttled_count = 0
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._remaining = None
+        self._reset_at = None
+        self._paused_until = 0.0
+        self._next_slot = 0.0
+
+    @property
+    def headers(self):
+        return self.session.headers
+
+    def _wait_for_slot(self):
+        with self._lock:
+            now = time.time()
+            wait_until = self._paused_until
+            if self._remaining is not None and self._reset_at and self._remaining < LOW_BUDGET:
+                # Distribui o saldo restante até o reset da janela
+                interval = max(self._reset_at - now, 0) / max(self._remaining, 1)
+                slot = max(self._next_slot, now)
+                self._next_slot = slot + interval
+                wait_until = max(wait_until, slot)
+        delay = min(wait_until - time.time(), MAX_WAIT_SECONDS)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _update_budget(self, response):
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        reset = response.headers.get('X-RateLimit-Reset')
+        with self._lock:
+            if remaining is not None:
+                self._remaining = int(remaining)
+            if reset is not None:
+                reset_at = int(reset)
+                if self._reset_at != reset_at:
+                    # Nova janela: o espaçamento recomeça
+                    self._next_slot = 0.0
+                self._reset_at = reset_at
+
+    def _retry_delay(self, response, attempt):
+        retry_after = response.headers.get('Retry-After')
+        if retry_after is not None:
+            return int(retry_after)
+        if response.headers.get('X-RateLimit-Remaining') == '0' and response.headers.get('X-RateLimit-Reset'):
+            return max(int(response.headers['X-RateLimit-Reset']) - time.time(), 0) + 1
+        # Limite secundário sem Retry-After: backoff exponencial
+        return 2 ** attempt * 10
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_slot()
+            with self._semaphore:
+                response = self.session.request(method, url, **kwargs)
+            self._update_budget(response)
+
+            if not is_throttled(response):
+                return response
+
+            with self._lock:
+                self.throttled_count += 1
+            if attempt == self.max_retries:
+                break
+
+            delay = min(self._retry_delay(response, attempt), MAX_WAIT_SECONDS)
+            print(f'Limite de requisições atingido, aguardando {delay:.0f}s antes de tentar novamente...')
+            with self._lock:
+                self._paused_until = max(self._paused_until, time.time() + delay)
+
+        return response
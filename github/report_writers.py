@@ -0,0 +1,185 @@
+import csv
+import heapq
+import json
+import os
+import sqlite3
+import tempfile
+
+FIELDNAMES = [
+    'repositorio',
+    'severidade',
+    'pacote',
+    'versao_vulneravel',
+    'primeira_deteccao',
+    'estado',
+    'titulo',
+    'descricao',
+    'link_github',
+    'status_processamento'
+]
+
+# Linhas mantidas em memória antes de gravar um lote (Parquet/SQLite) ou
+# de despejar um bloco ordenado em disco (external_sort)
+BATCH_SIZE = 5000
+SORT_CHUNK_SIZE = 50000
+
+
+class CsvReportWriter:
+    def __init__(self, path):
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.DictWriter(self.file, fieldnames=FIELDNAMES)
+        self.writer.writeheader()
+
+    def write(self, row):
+        self.writer.writerow(row)
+
+    def close(self):
+        self.file.close()
+
+
+class JsonlReportWriter:
+    def __init__(self, path):
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def write(self, row):
+        self.file.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetReportWriter:
+    """
+    Grava as linhas em lotes (row groups) com pyarrow, que é opcional e só
+    é importado quando esse formato é usado.
+    """
+
+    def __init__(self, path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError('O formato parquet requer o pacote pyarrow (pip install pyarrow)')
+
+        self.pyarrow = pyarrow
+        self.schema = pyarrow.schema([(name, pyarrow.string()) for name in FIELDNAMES])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        self.batch = []
+
+    def write(self, row):
+        self.batch.append(row)
+        if len(self.batch) >= BATCH_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if self.batch:
+            table = self.pyarrow.Table.from_pylist(self.batch, schema=self.schema)
+            self.writer.write_table(table)
+            self.batch = []
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+
+
+class SqliteReportWriter:
+    """
+    Grava as linhas em uma tabela SQLite com índices por repositório e por
+    severidade, para consultas sem carregar o relatório inteiro.
+    """
+
+    def __init__(self, path):
+        if os.path.exists(path):
+            os.remove(path)
+        self.connection = sqlite3.connect(path)
+        columns = ', '.join(f'{name} TEXT' for name in FIELDNAMES)
+        self.connection.execute(f'CREATE TABLE vulnerabilidades ({columns})')
+        self.connection.execute('CREATE INDEX idx_vulnerabilidades_repositorio ON vulnerabilidades (repositorio)')
+        self.connection.execute('CREATE INDEX idx_vulnerabilidades_severidade ON vulnerabilidades (severidade)')
+        self.insert = (
+            f'INSERT INTO vulnerabilidades ({", ".join(FIELDNAMES)}) '
+            f'VALUES ({", ".join("?" for _ in FIELDNAMES)})'
+        )
+        self.batch = []
+
+    def write(self, row):
+        self.batch.append(tuple(row[name] for name in FIELDNAMES))
+        if len(self.batch) >= BATCH_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if self.batch:
+            self.connection.executemany(self.insert, self.batch)
+            self.connection.commit()
+            self.batch = []
+
+    def close(self):
+        self._flush()
+        self.connection.close()
+
+
+WRITERS = {
+    'csv': CsvReportWriter,
+    'jsonl': JsonlReportWriter,
+    'parquet': ParquetReportWriter,
+    'sqlite': SqliteReportWriter
+}
+
+
+def write_report(rows, output_file, output_format='csv'):
+    """
+    Grava as linhas no arquivo à medida que chegam e retorna quantas foram
+    gravadas. Se a execução falhar no meio, o que já foi gravado é mantido.
+    """
+    writer = WRITERS[output_format](output_file)
+    count = 0
+    try:
+        for row in rows:
+            writer.write(row)
+            count += 1
+    finally:
+        writer.close()
+    return count
+
+
+def external_sort(rows, key, chunk_size=SORT_CHUNK_SIZE):
+    """
+    Ordena um fluxo de linhas com memória limitada: blocos de chunk_size
+    linhas são ordenados e despejados em arquivos temporários, depois
+    intercalados com heapq.merge. A ordenação é estável, como sorted().
+    """
+    chunk_files = []
+    try:
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                chunk_files.append(_spill_chunk(sorted(chunk, key=key)))
+                chunk = []
+
+        if not chunk_files:
+            # Tudo coube em memória
+            yield from sorted(chunk, key=key)
+            return
+
+        if chunk:
+            chunk_files.append(_spill_chunk(sorted(chunk, key=key)))
+
+        readers = [_read_chunk(chunk_file) for chunk_file in chunk_files]
+        yield from heapq.merge(*readers, key=key)
+    finally:
+        for chunk_file in chunk_files:
+            chunk_file.close()
+
+
+def _spill_chunk(rows):
+    chunk_file = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+    for row in rows:
+        chunk_file.write(json.dumps(row, ensure_ascii=False) + '\n')
+    chunk_file.seek(0)
+    return chunk_file
+
+
+def _read_chunk(chunk_file):
+    for line in chunk_file:
+        yield json.loads(line)
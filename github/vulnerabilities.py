@@ -1,156 +1,409 @@
 import requests
-import csv
+from collections import deque
 from datetime import datetime
 import os
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from rate_limit import RateLimitedSession, is_throttled
+from http_cache import ConditionalCacheSession, DEFAULT_MAX_AGE_SECONDS, DEFAULT_MAX_SIZE_BYTES
+from report_writers import WRITERS, external_sort, write_report
 
-def get_vulnerabilities(repos, github_token):
-    headers = {
+# Número padrão de requisições simultâneas à API do GitHub
+DEFAULT_MAX_WORKERS = 16
+# Maior tamanho de página aceito pela API do GitHub
+PER_PAGE = 100
+# Estados de alerta pedidos à API; alertas 'fixed' não entram no relatório
+ALERT_STATES = 'auto_dismissed,dismissed,open'
+
+GRAPHQL_URL = 'https://api.github.com/graphql'
+# Repositórios consultados por requisição GraphQL (um alias por repositório)
+DEFAULT_GRAPHQL_BATCH_SIZE = 25
+GRAPHQL_ALERT_STATES = '[OPEN, DISMISSED, AUTO_DISMISSED]'
+GRAPHQL_ALERT_FIELDS = '''
+    pageInfo { hasNextPage endCursor }
+    nodes {
+      number
+      state
+      createdAt
+      securityAdvisory { severity summary description }
+      securityVulnerability { package { name } vulnerableVersionRange }
+    }
+'''
+
+# Definindo ordem de prioridade para severidade
+SEVERITY_ORDER = {
+    'critical': 0,
+    'high': 1,
+    'medium': 2,
+    'low': 3,
+    'N/A': 4
+}
+
+def severity_sort_key(row):
+    return SEVERITY_ORDER.get(row['severidade'].lower(), 5)
+
+def report_sort_key(row):
+    # Ordenando primeiro por repositório e depois por severidade
+    return (row['repositorio'], severity_sort_key(row))
+
+def create_session(github_token, pool_size=DEFAULT_MAX_WORKERS, cache_path=None,
+                   cache_max_age=DEFAULT_MAX_AGE_SECONDS, cache_max_size=DEFAULT_MAX_SIZE_BYTES):
+    """
+    Cria uma sessão HTTP compartilhada entre as threads, reaproveitando as
+    conexões (keep-alive) em vez de abrir um novo handshake TLS por requisição.
+    As chamadas passam pelo agendador de limite de requisições da API e, se
+    cache_path for informado, pelo cache de requisições condicionais (ETag).
+    """
+    session = requests.Session()
+    session.headers.update({
         'Authorization': f'token {github_token}',
-        'Accept': 'application/vnd.github.v3+json',
-        'X-GitHub-Api-Version': '2022-11-28'
+        'Accept': 'application/vnd.github.v3+json'
+    })
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session = RateLimitedSession(session, pool_size)
+    if cache_path:
+        session = ConditionalCacheSession(session, cache_path, cache_max_age, cache_max_size)
+    return session
+
+def iter_pages(session, url, headers=None, params=None):
+    """
+    Percorre uma listagem paginada da API do GitHub seguindo o cabeçalho Link
+    (rel="next") e retorna cada resposta. O chamador verifica o status.
+    """
+    while url:
+        response = session.get(url, headers=headers, params=params)
+        yield response
+        url = response.links.get('next', {}).get('url')
+        # A URL do próximo link já contém os parâmetros da consulta
+        params = None
+
+def build_status_row(repo, descricao, status_processamento):
+    # Linha do relatório para repositórios sem alertas ou com erro
+    return {
+        'repositorio': repo,
+        'severidade': 'N/A',
+        'pacote': 'N/A',
+        'versao_vulneravel': 'N/A',
+        'primeira_deteccao': 'N/A',
+        'estado': 'N/A',
+        'titulo': 'N/A',
+        'descricao': descricao,
+        'link_github': 'N/A',
+        'status_processamento': status_processamento
     }
-    
-    all_vulnerabilities = []
-    
+
+def build_vulnerability_rows(repo, vulnerabilities):
+    """
+    Converte os alertas do Dependabot de um repositório em linhas do relatório.
+    """
+    rows = []
+    if not vulnerabilities:  # Repositório sem vulnerabilidades
+        rows.append(build_status_row(repo, 'Nenhuma vulnerabilidade encontrada', 'SEM_VULNERABILIDADES'))
+
+    for vuln in vulnerabilities:
+        # Pula vulnerabilidades com estado 'fixed'
+        if vuln.get('state') == 'fixed':
+            continue
+
+        vulnerability_info = {
+            'repositorio': repo,
+            'severidade': vuln.get('security_advisory', {}).get('severity', 'N/A'),
+            'pacote': vuln.get('security_advisory', {}).get('package', {}).get('name', 'N/A'),
+            'versao_vulneravel': vuln.get('security_vulnerability', {}).get('vulnerable_version_range', 'N/A'),
+            'primeira_deteccao': vuln.get('created_at', 'N/A'),
+            'estado': vuln.get('state', 'N/A'),
+            'titulo': vuln.get('security_advisory', {}).get('summary', 'N/A'),
+            'descricao': vuln.get('security_advisory', {}).get('description', 'N/A').replace('\n', ' '),
+            'link_github': vuln.get('html_url', 'N/A'),
+            'status_processamento': 'SUCESSO'
+        }
+        rows.append(vulnerability_info)
+
+    return rows
+
+def verify_token(session, headers=None):
     verify_url = 'https://api.github.com/user'
     try:
-        verify_response = requests.get(verify_url, headers=headers)
+        verify_response = session.get(verify_url, headers=headers)
         verify_response.raise_for_status()
         print('Token autenticado com sucesso')
+        return True
     except requests.exceptions.HTTPError as e:
         print(f'Erro na autenticação do token: {str(e)}')
-        return all_vulnerabilities
-    
-    for repo in repos:
-        try:
-            owner, repo_name = repo.split('/')
-            url = f'https://api.github.com/repos/{owner}/{repo_name}/dependabot/alerts'
-            
-            response = requests.get(url, headers=headers)
-            
+        return False
+
+def fetch_repo_vulnerabilities(session, repo, headers):
+    """
+    Busca os alertas do Dependabot de um único repositório e retorna as
+    linhas do relatório correspondentes.
+    """
+    try:
+        owner, repo_name = repo.split('/')
+        url = f'https://api.github.com/repos/{owner}/{repo_name}/dependabot/alerts'
+
+        vulnerabilities = []
+        for response in iter_pages(session, url, headers, {'per_page': PER_PAGE}):
+            if is_throttled(response):
+                print(f'Limite de requisições excedido para {repo}.')
+                return [build_status_row(repo, 'Limite de requisições da API excedido', 'ERRO_RATE_LIMIT')]
+
             if response.status_code == 403:
-                error_info = {
-                    'repositorio': repo,
-                    'severidade': 'N/A',
-                    'pacote': 'N/A',
-                    'versao_vulneravel': 'N/A',
-                    'primeira_deteccao': 'N/A',
-                    'estado': 'N/A',
-                    'titulo': 'N/A',
-                    'descricao': 'Acesso negado - Verifique permissões',
-                    'link_github': 'N/A',
-                    'status_processamento': 'ERRO_403'
-                }
-                all_vulnerabilities.append(error_info)
                 print(f'Acesso negado para {repo}. Verifique permissões.')
-                continue
-                
+                return [build_status_row(repo, 'Acesso negado - Verifique permissões', 'ERRO_403')]
+
             response.raise_for_status()
-            vulnerabilities = response.json()
-            
-            if not vulnerabilities:  # Repositório sem vulnerabilidades
-                no_vuln_info = {
-                    'repositorio': repo,
-                    'severidade': 'N/A',
-                    'pacote': 'N/A',
-                    'versao_vulneravel': 'N/A',
-                    'primeira_deteccao': 'N/A',
-                    'estado': 'N/A',
-                    'titulo': 'N/A',
-                    'descricao': 'Nenhuma vulnerabilidade encontrada',
-                    'link_github': 'N/A',
-                    'status_processamento': 'SEM_VULNERABILIDADES'
-                }
-                all_vulnerabilities.append(no_vuln_info)
-            
-            for vuln in vulnerabilities:
-                # Pula vulnerabilidades com estado 'fixed'
-                if vuln.get('state') == 'fixed':
+            vulnerabilities.extend(response.json())
+
+        return build_vulnerability_rows(repo, vulnerabilities)
+
+    except Exception as e:
+        print(f'Erro ao processar {repo}: {str(e)}')
+        return [build_status_row(repo, f'Erro ao processar: {str(e)}', 'ERRO')]
+
+def iter_vulnerabilities(repos, github_token, max_workers=DEFAULT_MAX_WORKERS, session=None):
+    """
+    Busca os alertas dos repositórios em paralelo e retorna as linhas à
+    medida que cada repositório termina, já na ordem do relatório: os
+    repositórios são percorridos em ordem alfabética e as linhas de cada um
+    são ordenadas por severidade. Assim a ordenação só precisa de memória
+    para os alertas de um repositório por vez.
+    """
+    headers = {
+        'X-GitHub-Api-Version': '2022-11-28'
+    }
+    session = session or create_session(github_token, max_workers)
+    if not verify_token(session, headers):
+        return
+
+    # Mantém um número limitado de repositórios em andamento, na ordem de saída
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for repo in sorted(repos):
+            pending.append(executor.submit(fetch_repo_vulnerabilities, session, repo, headers))
+            if len(pending) >= max_workers * 4:
+                yield from sorted(pending.popleft().result(), key=severity_sort_key)
+        while pending:
+            yield from sorted(pending.popleft().result(), key=severity_sort_key)
+
+def get_vulnerabilities(repos, github_token, max_workers=DEFAULT_MAX_WORKERS, session=None):
+    return list(iter_vulnerabilities(repos, github_token, max_workers, session))
+
+def iter_org_vulnerabilities(organization, prefix, github_token, session=None):
+    """
+    Busca os alertas de todos os repositórios da organização pelo endpoint
+    /orgs/{org}/dependabot/alerts, com paginação completa, sem listar os
+    repositórios. O filtro de prefixo é aplicado localmente. As linhas saem
+    na ordem da API, página por página.
+
+    Repositórios sem alertas não aparecem nesse endpoint, portanto não geram
+    linhas SEM_VULNERABILIDADES. Se a busca falhar no meio da paginação, uma
+    linha de status com o nome da organização (ERRO_RATE_LIMIT, ERRO_403 ou
+    ERRO) indica que o relatório está incompleto.
+    """
+    headers = {
+        'X-GitHub-Api-Version': '2022-11-28'
+    }
+    session = session or create_session(github_token)
+
+    url = f'https://api.github.com/orgs/{organization}/dependabot/alerts'
+    params = {'per_page': PER_PAGE, 'state': ALERT_STATES}
+    pages = 0
+    try:
+        for response in iter_pages(session, url, headers, params):
+            if is_throttled(response):
+                print(f'Limite de requisições excedido ao buscar os alertas da organização {organization}.')
+                yield build_status_row(organization, 'Limite de requisições da API excedido', 'ERRO_RATE_LIMIT')
+                break
+
+            if response.status_code == 403:
+                print(f'Acesso negado aos alertas da organização {organization}. Verifique permissões.')
+                yield build_status_row(organization, 'Acesso negado - Verifique permissões', 'ERRO_403')
+                break
+
+            response.raise_for_status()
+            alerts = response.json()
+            pages += 1
+            for vuln in alerts:
+                repository = vuln.get('repository', {})
+                if prefix and prefix not in repository.get('name', '').lower():
                     continue
-                    
-                vulnerability_info = {
-                    'repositorio': repo,
-                    'severidade': vuln.get('security_advisory', {}).get('severity', 'N/A'),
-                    'pacote': vuln.get('security_advisory', {}).get('package', {}).get('name', 'N/A'),
-                    'versao_vulneravel': vuln.get('security_vulnerability', {}).get('vulnerable_version_range', 'N/A'),
-                    'primeira_deteccao': vuln.get('created_at', 'N/A'),
-                    'estado': vuln.get('state', 'N/A'),
-                    'titulo': vuln.get('security_advisory', {}).get('summary', 'N/A'),
-                    'descricao': vuln.get('security_advisory', {}).get('description', 'N/A').replace('\n', ' '),
-                    'link_github': vuln.get('html_url', 'N/A'),
-                    'status_processamento': 'SUCESSO'
-                }
-                all_vulnerabilities.append(vulnerability_info)
-            
-        except Exception as e:
-            error_info = {
-                'repositorio': repo,
-                'severidade': 'N/A',
-                'pacote': 'N/A',
-                'versao_vulneravel': 'N/A',
-                'primeira_deteccao': 'N/A',
-                'estado': 'N/A',
-                'titulo': 'N/A',
-                'descricao': f'Erro ao processar: {str(e)}',
-                'link_github': 'N/A',
-                'status_processamento': 'ERRO'
-            }
-            all_vulnerabilities.append(error_info)
-            print(f'Erro ao processar {repo}: {str(e)}')
-    
-    return all_vulnerabilities
+                yield from build_vulnerability_rows(repository.get('full_name'), [vuln])
+    except Exception as e:
+        print(f'Erro ao buscar os alertas da organização {organization}: {str(e)}')
+        yield build_status_row(organization, f'Erro ao processar: {str(e)}', 'ERRO')
 
-def save_to_csv(vulnerabilities, output_file):
-    fieldnames = [
-        'repositorio',
-        'severidade',
-        'pacote',
-        'versao_vulneravel',
-        'primeira_deteccao',
-        'estado',
-        'titulo',
-        'descricao',
-        'link_github',
-        'status_processamento'
-    ]
-    
-    # Definindo ordem de prioridade para severidade
-    severity_order = {
-        'critical': 0,
-        'high': 1,
-        'medium': 2,
-        'low': 3,
-        'N/A': 4
+    print(f'Alertas da organização obtidos em {pages} páginas')
+
+def get_org_vulnerabilities(organization, prefix, github_token, session=None):
+    return list(iter_org_vulnerabilities(organization, prefix, github_token, session))
+
+def graphql_alert_to_rest(repo, node):
+    """
+    Converte um nó de vulnerabilityAlerts do GraphQL para o formato do REST,
+    para reaproveitar build_vulnerability_rows.
+    """
+    advisory = node.get('securityAdvisory') or {}
+    vulnerability = node.get('securityVulnerability') or {}
+    severity = (advisory.get('severity') or 'N/A').lower()
+    return {
+        'state': (node.get('state') or 'N/A').lower(),
+        'created_at': node.get('createdAt', 'N/A'),
+        'html_url': f'https://github.com/{repo}/security/dependabot/{node.get("number")}',
+        'security_advisory': {
+            # O GraphQL chama de MODERATE o que o REST chama de medium
+            'severity': 'medium' if severity == 'moderate' else severity,
+            'summary': advisory.get('summary', 'N/A'),
+            'description': advisory.get('description', 'N/A'),
+            'package': {'name': (vulnerability.get('package') or {}).get('name', 'N/A')}
+        },
+        'security_vulnerability': {
+            'vulnerable_version_range': vulnerability.get('vulnerableVersionRange', 'N/A')
+        }
     }
-    
-    # Ordenando primeiro por repositório e depois por severidade
-    sorted_vulnerabilities = sorted(
-        vulnerabilities,
-        key=lambda x: (
-            x['repositorio'],
-            severity_order.get(x['severidade'].lower(), 5)
+
+def build_graphql_query(requests_by_alias):
+    """
+    Monta uma consulta com um alias por repositório. requests_by_alias mapeia
+    o alias para (owner, nome, cursor ou None).
+    """
+    variables = {}
+    definitions = []
+    selections = []
+    for alias, (owner, name, cursor) in requests_by_alias.items():
+        variables[f'{alias}_owner'] = owner
+        variables[f'{alias}_name'] = name
+        definitions += [f'${alias}_owner: String!', f'${alias}_name: String!']
+        after = ''
+        if cursor:
+            variables[f'{alias}_after'] = cursor
+            definitions.append(f'${alias}_after: String')
+            after = f', after: ${alias}_after'
+        selections.append(
+            f'{alias}: repository(owner: ${alias}_owner, name: ${alias}_name) {{ '
+            f'vulnerabilityAlerts(first: {PER_PAGE}, states: {GRAPHQL_ALERT_STATES}{after}) {{ '
+            f'{GRAPHQL_ALERT_FIELDS} }} }}'
         )
-    )
-    
-    with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        for vuln in sorted_vulnerabilities:
-            writer.writerow(vuln)
+    query = f'query({", ".join(definitions)}) {{\n' + '\n'.join(selections) + '\n}'
+    return query, variables
 
-def get_repositories(github_token, organization, prefix):
-    headers = {
-        'Authorization': f'token {github_token}',
-        'Accept': 'application/vnd.github.v3+json'
+def fetch_graphql_batch(session, repos):
+    """
+    Busca os alertas de um lote de repositórios com consultas GraphQL, uma
+    por página: os repositórios com mais alertas seguem o cursor nas
+    consultas seguintes, ainda agrupados. Retorna {repo: linhas}.
+    """
+    aliases = {f'r{i}': repo for i, repo in enumerate(repos)}
+    alerts = {repo: [] for repo in repos}
+    errors = {}
+    pending = {alias: None for alias in aliases}
+
+    while pending:
+        requests_by_alias = {
+            alias: (*aliases[alias].split('/'), cursor) for alias, cursor in pending.items()
+        }
+        query, variables = build_graphql_query(requests_by_alias)
+        try:
+            response = session.post(GRAPHQL_URL, json={'query': query, 'variables': variables})
+            if is_throttled(response):
+                for alias in pending:
+                    errors[aliases[alias]] = build_status_row(
+                        aliases[alias], 'Limite de requisições da API excedido', 'ERRO_RATE_LIMIT'
+                    )
+                break
+            response.raise_for_status()
+            payload = response.json()
+        except Exception as e:
+            for alias in pending:
+                errors[aliases[alias]] = build_status_row(aliases[alias], f'Erro ao processar: {str(e)}', 'ERRO')
+            break
+
+        # Erros do GraphQL vêm por alias, no primeiro elemento de 'path'; os
+        # erros sem 'path' valem para a consulta inteira
+        for error in payload.get('errors') or []:
+            alias = (error.get('path') or [None])[0]
+            if alias is None:
+                affected = [pending_alias for pending_alias in pending if aliases[pending_alias] not in errors]
+            elif alias in pending:
+                affected = [alias]
+            else:
+                continue
+            for alias in affected:
+                repo = aliases[alias]
+                if error.get('type') == 'FORBIDDEN':
+                    print(f'Acesso negado para {repo}. Verifique permissões.')
+                    errors[repo] = build_status_row(repo, 'Acesso negado - Verifique permissões', 'ERRO_403')
+                elif error.get('type') == 'RATE_LIMITED':
+                    errors[repo] = build_status_row(repo, 'Limite de requisições da API excedido', 'ERRO_RATE_LIMIT')
+                else:
+                    print(f'Erro ao processar {repo}: {error.get("message")}')
+                    errors[repo] = build_status_row(repo, f'Erro ao processar: {error.get("message")}', 'ERRO')
+
+        data = payload.get('data') or {}
+        next_pending = {}
+        for alias in pending:
+            repo = aliases[alias]
+            connection = (data.get(alias) or {}).get('vulnerabilityAlerts')
+            if repo in errors or connection is None:
+                if repo not in errors:
+                    errors[repo] = build_status_row(repo, 'Erro ao processar: repositório não retornado', 'ERRO')
+                continue
+            alerts[repo].extend(graphql_alert_to_rest(repo, node) for node in connection['nodes'])
+            if connection['pageInfo']['hasNextPage']:
+                next_pending[alias] = connection['pageInfo']['endCursor']
+        pending = next_pending
+
+    return {
+        repo: [errors[repo]] if repo in errors else build_vulnerability_rows(repo, alerts[repo])
+        for repo in repos
     }
-    
+
+def iter_graphql_vulnerabilities(repos, github_token, batch_size=DEFAULT_GRAPHQL_BATCH_SIZE,
+                                 max_workers=DEFAULT_MAX_WORKERS, session=None):
+    """
+    Alternativa a iter_vulnerabilities usando a conexão vulnerabilityAlerts
+    do GraphQL: cada requisição cobre batch_size repositórios. As linhas
+    seguem o mesmo formato e a mesma ordem do relatório.
+
+    O limite primário do GraphQL chega como HTTP 200 com erro RATE_LIMITED;
+    a sessão trata esse caso como bloqueio e repete o lote após o reset, e
+    só depois das tentativas os repositórios saem como ERRO_RATE_LIMIT.
+    """
+    session = session or create_session(github_token, max_workers)
+    if not verify_token(session, {'X-GitHub-Api-Version': '2022-11-28'}):
+        return
+    sorted_repos = sorted(repos)
+    batches = [sorted_repos[i:i + batch_size] for i in range(0, len(sorted_repos), batch_size)]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for batch in batches:
+            pending.append((batch, executor.submit(fetch_graphql_batch, session, batch)))
+            if len(pending) >= max_workers * 2:
+                batch_done, future = pending.popleft()
+                rows_by_repo = future.result()
+                for repo in batch_done:
+                    yield from sorted(rows_by_repo[repo], key=severity_sort_key)
+        while pending:
+            batch_done, future = pending.popleft()
+            rows_by_repo = future.result()
+            for repo in batch_done:
+                yield from sorted(rows_by_repo[repo], key=severity_sort_key)
+
+def save_to_csv(vulnerabilities, output_file):
+    write_report(sorted(vulnerabilities, key=report_sort_key), output_file, 'csv')
+
+def get_repositories(github_token, organization, prefix, session=None):
+    session = session or create_session(github_token)
+
     repos = []
     page = 1
     while True:
         url = f'https://api.github.com/orgs/{organization}/repos?per_page=100&page={page}'
-        response = requests.get(url, headers=headers)
+        response = session.get(url)
         response.raise_for_status()
         
         repositories = response.json()
@@ -173,8 +426,31 @@ def main():
     parser.add_argument('--token', help='Token de acesso do GitHub', default=os.getenv('GITHUB_TOKEN'))
     parser.add_argument('--org', help='Nome da organização no GitHub', default=os.getenv('GITHUB_ORG'))
     parser.add_argument('--prefix', help='Prefixo para filtrar repositórios', default=os.getenv('REPO_PREFIX', ''))
+    parser.add_argument('--workers', type=int, help='Número de requisições simultâneas à API do GitHub',
+                        default=int(os.getenv('GITHUB_WORKERS', DEFAULT_MAX_WORKERS)))
+    # Modos de busca alternativos, um de cada vez
+    mode_group = parser.add_mutually_exclusive_group()
+    mode_group.add_argument('--org-alerts', action='store_true',
+                            help='Busca os alertas pelo endpoint da organização, sem listar os repositórios',
+                            default=os.getenv('ORG_ALERTS', '').lower() in ('1', 'true'))
+    mode_group.add_argument('--graphql', action='store_true',
+                            help='Busca os alertas pela API GraphQL, agrupando vários repositórios por requisição',
+                            default=os.getenv('USE_GRAPHQL', '').lower() in ('1', 'true'))
+    parser.add_argument('--graphql-batch-size', type=int, help='Repositórios por requisição GraphQL',
+                        default=int(os.getenv('GRAPHQL_BATCH_SIZE', DEFAULT_GRAPHQL_BATCH_SIZE)))
+    parser.add_argument('--format', choices=sorted(WRITERS), help='Formato do relatório',
+                        default=os.getenv('REPORT_FORMAT', 'csv'))
+    parser.add_argument('--cache', help='Arquivo SQLite do cache de respostas (ETag) entre execuções',
+                        default=os.getenv('GITHUB_CACHE'))
+    parser.add_argument('--cache-max-age-hours', type=float, help='Validade das entradas do cache em horas',
+                        default=DEFAULT_MAX_AGE_SECONDS / 3600)
+    parser.add_argument('--cache-max-mb', type=float, help='Tamanho máximo do cache em MB',
+                        default=DEFAULT_MAX_SIZE_BYTES / (1024 * 1024))
     
     args = parser.parse_args()
+    # Os padrões vindos do ambiente não passam pelo grupo exclusivo
+    if args.org_alerts and args.graphql:
+        parser.error('--org-alerts e --graphql (ou ORG_ALERTS e USE_GRAPHQL) não podem ser usados juntos')
     
     # Verificar se token e organização foram fornecidos
     if not args.token:
@@ -182,23 +458,46 @@ def main():
     if not args.org:
         raise ValueError('Organização não fornecida. Use --org ou defina a variável de ambiente GITHUB_ORG')
     
-    print('Buscando repositórios...')
-    repos = get_repositories(args.token, args.org, args.prefix)
-    print(f'Encontrados {len(repos)} repositórios')
-    
-    # Obter vulnerabilidades
-    print('Buscando vulnerabilidades...')
-    vulnerabilities = get_vulnerabilities(repos, args.token)
-    
+    # Sessão compartilhada por todas as chamadas à API
+    session = create_session(args.token, args.workers, args.cache,
+                             int(args.cache_max_age_hours * 3600), int(args.cache_max_mb * 1024 * 1024))
+
     # Gerar nome do arquivo com timestamp
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    output_file = f'vulnerabilidades_{timestamp}.csv'
-    
-    # Salvar no CSV
-    save_to_csv(vulnerabilities, output_file)
-    
+    output_file = f'vulnerabilidades_{timestamp}.{args.format}'
+
+    if args.org_alerts:
+        print('Buscando vulnerabilidades da organização...')
+        # Os alertas chegam fora de ordem; ordenação externa com memória limitada
+        vulnerabilities = external_sort(
+            iter_org_vulnerabilities(args.org, args.prefix, args.token, session),
+            key=report_sort_key
+        )
+    else:
+        print('Buscando repositórios...')
+        repos = get_repositories(args.token, args.org, args.prefix, session)
+        print(f'Encontrados {len(repos)} repositórios')
+
+        # Obter vulnerabilidades
+        print('Buscando vulnerabilidades...')
+        if args.graphql:
+            vulnerabilities = iter_graphql_vulnerabilities(
+                repos, args.token, args.graphql_batch_size, args.workers, session
+            )
+        else:
+            vulnerabilities = iter_vulnerabilities(repos, args.token, args.workers, session)
+
+    # Gravar o relatório à medida que os repositórios são processados
+    total = write_report(vulnerabilities, output_file, args.format)
+
+    if args.cache:
+        print(f'Cache: {session.hits} respostas reaproveitadas (304), {session.misses} baixadas, '
+              f'taxa de acerto {session.hit_ratio:.1%}')
+        session.close()
+    if session.throttled_count:
+        print(f'Requisições limitadas pela API (repetidas com espera): {session.throttled_count}')
     print(f'Relatório salvo em: {output_file}')
-    print(f'Total de vulnerabilidades encontradas: {len(vulnerabilities)}')
+    print(f'Total de vulnerabilidades encontradas: {total}')
 
 if __name__ == '__main__':
     main()
\ No newline at end of file